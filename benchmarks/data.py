@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+
+def make_fixtures(n_rows: int, n_teams: int = 20, seed: int = 0) -> pd.DataFrame:
+    """
+    This function is to generate league fixtures in chronological order
+    :param n_rows: the number of matches
+    :param n_teams: the number of teams
+    :param seed: the random seed
+    :return: the matches with the ids of team a (home) and team b (away), their goals, the state (0 means that A
+        losses, 1 means a draw, and 2 means that A wins) and the match date
+    """
+    rng = np.random.default_rng(seed)
+    a_id = rng.integers(0, n_teams, n_rows)
+    # draw the away team among the other teams
+    b_id = (a_id + rng.integers(1, max(n_teams, 2), n_rows)) % max(n_teams, 2)
+    strength = rng.normal(0.0, 0.3, max(n_teams, 2))
+    a_goals = rng.poisson(np.exp(0.35 + strength[a_id] - strength[b_id]))
+    b_goals = rng.poisson(np.exp(0.10 + strength[b_id] - strength[a_id]))
+    state = np.where(a_goals > b_goals, 2, np.where(a_goals == b_goals, 1, 0))
+    date = pd.Timestamp('2000-01-01') + pd.to_timedelta(np.sort(rng.uniform(0, n_rows / 4, n_rows)), unit='D')
+    return pd.DataFrame({
+        'a_id': a_id,
+        'b_id': b_id,
+        'a_goals': a_goals.astype(float),
+        'b_goals': b_goals.astype(float),
+        'state': state,
+        'date': date,
+    })
+
+
+def make_events(n_rows: int, n_groups: int = 100, n_categories: int = 10, seed: int = 0) -> pd.DataFrame:
+    """
+    This function is to generate grouped event logs with a numeric index
+    :param n_rows: the number of events
+    :param n_groups: the number of groups
+    :param n_categories: the number of event categories
+    :param seed: the random seed
+    :return: the events with the group id, the numeric index (e.g. minutes since the start), a value and a category
+    """
+    rng = np.random.default_rng(seed)
+    group = rng.integers(0, n_groups, n_rows)
+    index = np.sort(rng.uniform(0, 90, n_rows))
+    # a few categories are much more frequent than the others
+    p = 1.0 / np.arange(1, n_categories + 1)
+    category = rng.choice(n_categories, n_rows, p=p / p.sum())
+    return pd.DataFrame({
+        'group': group,
+        'index': index,
+        'value': rng.exponential(1.0, n_rows),
+        'category': pd.Series(category).map(lambda c: 'c{}'.format(c)),
+    })
@@ -0,0 +1,162 @@
+import argparse
+import gc
+import json
+import platform
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from time_series.avg import (avg, group_avg, group_last_k_avg, group_moment_avg, group_time_moment_avg, last_k_avg,
+                             moment_avg)
+from time_series.count import count, group_category_count_index, group_last_k_count, last_k_count
+from time_series.diff import group_last_k_diff_avg, group_last_k_diff_sum
+from time_series.form import form
+from time_series.lag import group_lag, lag
+from time_series.streak import weight_streak, weighted_last_k
+from time_series.sum import cum_sum, group_last_k_sum, group_sum, group_sum_index, last_k_sum
+
+from .data import make_events, make_fixtures
+
+GOALS = ['a_goals', 'b_goals']
+
+# name -> (data generator, calculation)
+CASES: Dict[str, tuple] = {
+    'form': ('fixtures', lambda df: form(df, 'a_id', 'b_id', 0.33, 'state')),
+    'form_sweep_10': ('fixtures', lambda df: form(df, 'a_id', 'b_id', np.linspace(0.05, 0.5, 10), 'state')),
+    'weight_streak': ('fixtures', lambda df: weight_streak(df, 'a_id', 6, 'state')),
+    'weighted_last_k': ('fixtures', lambda df: weighted_last_k(df, GOALS, [1, 2, 3, 4, 5], group_by=['a_id'])),
+    'last_k_sum': ('fixtures', lambda df: last_k_sum(df, GOALS, 5)),
+    'last_k_avg': ('fixtures', lambda df: last_k_avg(df, GOALS, 5)),
+    'cum_sum': ('fixtures', lambda df: cum_sum(df, GOALS)),
+    'avg': ('fixtures', lambda df: avg(df, GOALS)),
+    'moment_avg': ('fixtures', lambda df: moment_avg(df, GOALS, 0.3)),
+    'lag': ('fixtures', lambda df: lag(df, GOALS, 1)),
+    'group_last_k_sum': ('fixtures', lambda df: group_last_k_sum(df, GOALS, 5, ['a_id'])),
+    'group_last_k_avg': ('fixtures', lambda df: group_last_k_avg(df, GOALS, 5, ['a_id'])),
+    'group_sum': ('fixtures', lambda df: group_sum(df, GOALS, ['a_id'])),
+    'group_avg': ('fixtures', lambda df: group_avg(df, GOALS, ['a_id'])),
+    'group_moment_avg': ('fixtures', lambda df: group_moment_avg(df, GOALS, 0.3, ['a_id'])),
+    'group_time_moment_avg': ('fixtures', lambda df: group_time_moment_avg(df, GOALS, '30 days', 'date', ['a_id'])),
+    'group_lag': ('fixtures', lambda df: group_lag(df, 1, ['a_id'], cols=GOALS)),
+    'group_last_k_sum_snapshot': ('fixtures', lambda df: group_last_k_sum(df, GOALS, 5, ['a_id'], historical=False)),
+    'group_last_k_diff_sum': ('fixtures', lambda df: group_last_k_diff_sum(df, ['a_goals'], ['b_goals'], 5,
+                                                                           ['a_id'])),
+    'group_last_k_diff_avg': ('fixtures', lambda df: group_last_k_diff_avg(df, ['a_goals'], ['b_goals'], 5,
+                                                                           ['a_id'])),
+    'count': ('events', lambda df: count(df, ['category'])),
+    'last_k_count': ('events', lambda df: last_k_count(df, ['category'], 10)),
+    'group_last_k_count_sparse': ('events', lambda df: group_last_k_count(df, ['category'], 10, ['group'],
+                                                                          sparse=True)),
+    'group_sum_index': ('events', lambda df: group_sum_index(df, ['value'], ['group'], 'index', 5.0)),
+    'group_category_count_index': ('events', lambda df: group_category_count_index(df, 'category', ['group'],
+                                                                                   'index', 5.0)),
+}
+
+
+def run_case(func: Callable, df_data: pd.DataFrame, repeat: int) -> dict:
+    """
+    This function is to time a calculation and measure its peak memory
+    :param func: the calculation
+    :param df_data: input data
+    :param repeat: the number of timed runs, the best one is kept
+    :return: the best wall time in seconds and the peak allocated bytes
+    """
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(df_data)
+        seconds.append(time.perf_counter() - start)
+
+    # memory is traced in a separate run, as tracing slows the calculation down
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(df_data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(seconds), 'peak_bytes': peak}
+
+
+def run(sizes: List[int], cases: Optional[List[str]] = None, n_groups: int = 100, n_categories: int = 10,
+        repeat: int = 3, seed: int = 0) -> dict:
+    """
+    This function is to run the benchmark cases across a sweep of data sizes
+    :param sizes: the numbers of rows
+    :param cases: the names of the cases to run. If None, all the cases
+    :param n_groups: the number of teams or event groups
+    :param n_categories: the number of event categories
+    :param repeat: the number of timed runs per case and size
+    :param seed: the random seed of the data generators
+    :return: the environment and one result per case and size
+    """
+    results = []
+    for n_rows in sizes:
+        data = {
+            'fixtures': make_fixtures(n_rows, n_teams=n_groups, seed=seed),
+            'events': make_events(n_rows, n_groups=n_groups, n_categories=n_categories, seed=seed),
+        }
+        for name in cases or list(CASES):
+            kind, func = CASES[name]
+            result = run_case(func, data[kind], repeat)
+            result.update({'case': name, 'rows': n_rows, 'groups': n_groups, 'categories': n_categories})
+            results.append(result)
+            print('{:<32}{:>10}{:>12.4f}s{:>14.1f}MB'.format(name, n_rows, result['seconds'],
+                                                             result['peak_bytes'] / 2 ** 20))
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(old: dict, new: dict, threshold: float = 1.1) -> pd.DataFrame:
+    """
+    This function is to compare two benchmark runs
+    :param old: the baseline run
+    :param new: the new run
+    :param threshold: the time ratio above which a case is marked as a regression
+    :return: the times, peak memories and their ratios for the cases and sizes in both runs
+    """
+    keys = ['case', 'rows']
+    df_old = pd.DataFrame(old['results']).set_index(keys)[['seconds', 'peak_bytes']]
+    df_new = pd.DataFrame(new['results']).set_index(keys)[['seconds', 'peak_bytes']]
+    df = df_old.join(df_new, lsuffix='_old', rsuffix='_new', how='inner')
+    df['time_ratio'] = df['seconds_new'] / df['seconds_old']
+    df['memory_ratio'] = df['peak_bytes_new'] / df['peak_bytes_old']
+    df['regression'] = df['time_ratio'] > threshold
+    return df
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the time_series features on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=None)
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--compare', help='compare the results with a previous json file')
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.cases, args.groups, args.categories, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report).to_string())
+
+
+if __name__ == '__main__':
+    main()
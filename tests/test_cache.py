@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from time_series.avg import group_avg
+from time_series.cache import ResultCache
+from time_series.count import count
+from time_series.encoder import CategoryEncoder
+from time_series.lag import group_lag
+from time_series.plan import Feature
+from time_series.sum import group_last_k_sum, group_sum
+from time_series.team import team_features
+
+
+def test_key_reads_only_the_input_columns():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'g': rng.integers(0, 5, 100), 'x': rng.random(100), 'unused': rng.random(100)})
+    other = df.assign(unused=0.0)
+    cache = ResultCache()
+    key = cache.key(group_last_k_sum, df, ['x'], 3, ['g'])
+    assert cache.key(group_last_k_sum, other, ['x'], 3, ['g']) == key
+    assert cache.key(group_last_k_sum, df.assign(x=df['x'] + 1), ['x'], 3, ['g']) != key
+    assert cache.key(group_last_k_sum, df.set_axis(df.index + 1), ['x'], 3, ['g']) != key
+    # cols=None shifts all the columns
+    assert cache.key(group_lag, other, 1, ['g']) != cache.key(group_lag, df, 1, ['g'])
+
+
+def test_key_of_features_and_encoders():
+    df = pd.DataFrame({'a': [1, 2, 1], 'b': [2, 1, 2], 'x': [1.0, 2.0, 3.0], 'y': [3.0, 2.0, 1.0]})
+    cols = {'x': ('x', 'y')}
+    cache = ResultCache()
+    key = cache.key(team_features, df, 'a', 'b', [Feature(group_sum, cols=['x'])], cols)
+    assert cache.key(team_features, df, 'a', 'b', [Feature(group_sum, cols=['x'])], cols) == key
+    assert cache.key(team_features, df, 'a', 'b', [Feature(group_avg, cols=['x'])], cols) != key
+    assert cache.key(team_features, df, 'a', 'b', [Feature(group_sum, name='s', cols=['x'])], cols) != key
+
+    encoder = CategoryEncoder().fit(df, ['a'])
+    key = cache.key(count, df, ['a'], encoder=encoder)
+    assert cache.key(count, df, ['a'], encoder=CategoryEncoder().fit(df, ['a'])) == key
+    assert cache.key(count, df, ['a'], encoder=CategoryEncoder({'a': [1, 2, 3]})) != key
+    encoder.fit(df.assign(a=[1, 2, 4]), ['a'])
+    assert cache.key(count, df, ['a'], encoder=encoder) != key
+
+    with pytest.raises(TypeError):
+        cache.key(count, df, ['a'], encoder=object())
+
+
+def test_eviction_and_stats(tmp_path):
+    df = pd.DataFrame({'g': [0, 1, 0, 1], 'x': [1.0, 2.0, 3.0, 4.0]})
+    cache = ResultCache(max_entries=2)
+    for k in [1, 2, 3]:
+        cache.call(group_last_k_sum, df, ['x'], k, ['g'])
+    assert cache.stats()['entries'] == 2
+    # k=1 is the least recently used, so it was evicted
+    cache.call(group_last_k_sum, df, ['x'], 3, ['g'])
+    cache.call(group_last_k_sum, df, ['x'], 1, ['g'])
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses']) == (1, 0, 4)
+    assert stats['hit_rate'] == 0.2
+    assert stats['bytes'] > 0
+
+    cache = ResultCache(max_entries=1, directory=str(tmp_path))
+    first = cache.call(group_last_k_sum, df, ['x'], 1, ['g'])
+    cache.call(group_last_k_sum, df, ['x'], 2, ['g'])
+    pd.testing.assert_frame_equal(cache.call(group_last_k_sum, df, ['x'], 1, ['g']), first)
+    assert cache.stats()['disk_hits'] == 1
+
+    size = os.path.getsize(cache._path(cache.key(group_last_k_sum, df, ['x'], 1, ['g'])))
+    cache = ResultCache(max_entries=1, directory=str(tmp_path), max_disk_bytes=size)
+    cache.clear()
+    for k in [1, 2]:
+        cache.call(group_last_k_sum, df, ['x'], k, ['g'])
+    assert len(os.listdir(str(tmp_path))) == 1
+    cache.call(group_last_k_sum, df, ['x'], 1, ['g'])
+    assert cache.stats()['disk_hits'] == 0
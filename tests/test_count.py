@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from time_series.count import count, group_count, group_last_k_count, last_k_count
+from time_series.encoder import CategoryEncoder
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'g': rng.integers(0, 20, 1000), 'c': rng.choice(['a', 'b', 'c', None], 1000)})
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+@pytest.mark.parametrize('historical', [False, True])
+def test_encoded_codes(data, sparse, historical):
+    encoder = CategoryEncoder().fit(data, ['c'])
+    codes = data[['g']].join(encoder.codes(data, ['c']))
+    for func, kwargs in ((count, {}), (last_k_count, {'k': 5})):
+        expected = func(data, ['c'], historical=historical, sparse=sparse, encoder=encoder, **kwargs)
+        result = func(codes, ['c'], historical=historical, sparse=sparse, encoder=encoder, encoded=True, **kwargs)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    if sparse and historical:
+        pd.testing.assert_frame_equal(group_count(codes, ['c'], ['g'], sparse=True, encoder=encoder, encoded=True),
+                                      group_count(data, ['c'], ['g'], sparse=True))
+    if not (historical or sparse):
+        for func, kwargs in ((group_count, {}), (group_last_k_count, {'k': 5})):
+            expected = func(data, ['c'], group_by=['g'], historical=False, encoder=encoder, **kwargs)
+            result = func(codes, ['c'], group_by=['g'], historical=False, encoder=encoder, encoded=True, **kwargs)
+            pd.testing.assert_frame_equal(result, expected)
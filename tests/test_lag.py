@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from time_series.lag import group_lag, group_lags
+
+
+def test_group_lags():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'g': rng.integers(0, 20, 500).astype(float), 'x': rng.random(500), 'y': rng.random(500)})
+    df.loc[::37, 'g'] = np.nan
+    k = 4
+    lags, grouping = group_lags(df, ['x', 'y'], k, ['g'])
+    assert not lags.flags.writeable
+    codes = np.repeat(np.arange(grouping.n_groups), grouping.sizes)
+    in_record_order = group_lags(df, ['x', 'y'], k, ['g'], record_order=True)
+    for j in range(1, k + 1):
+        expected = group_lag(df, j, ['g'], cols=['x', 'y']).to_numpy()
+        np.testing.assert_array_equal(grouping.scatter(lags[np.arange(grouping.n_valid) + k * codes, j - 1]),
+                                      expected)
+        np.testing.assert_array_equal(in_record_order[:, j - 1], expected)
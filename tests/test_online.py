@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from time_series.avg import group_avg, group_last_k_avg, group_moment_avg
+from time_series.lag import group_lag
+from time_series.online import AvgState, LagState, LastKAvgState, LastKSumState, MomentAvgState, SumState
+from time_series.sum import group_last_k_sum, group_sum
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(500, 2))
+    x[rng.random((500, 2)) < 0.2] = np.nan
+    return pd.DataFrame({'g': rng.integers(0, 10, 500), 'x': x[:, 0], 'y': x[:, 1]})
+
+
+@pytest.mark.parametrize('state, func', [
+    (LastKSumState(['x', 'y'], 3, ['g']), lambda df: group_last_k_sum(df, ['x', 'y'], 3, ['g'])),
+    (LastKAvgState(['x', 'y'], 3, ['g']), lambda df: group_last_k_avg(df, ['x', 'y'], 3, ['g'])),
+    (SumState(['x', 'y'], ['g']), lambda df: group_sum(df, ['x', 'y'], ['g'])),
+    (AvgState(['x', 'y'], ['g']), lambda df: group_avg(df, ['x', 'y'], ['g'])),
+    (MomentAvgState(['x', 'y'], 0.3, ['g']), lambda df: group_moment_avg(df, ['x', 'y'], 0.3, ['g'])),
+    (LagState(['x', 'y'], 2, ['g']), lambda df: group_lag(df, 2, ['g'], cols=['x', 'y'])),
+])
+def test_update_matches_historical(data, state, func):
+    state.fit(data.iloc[:300])
+    result = np.array([state.update(row) for _, row in data.iloc[300:].iterrows()])
+    expected = func(data)[['x', 'y']].to_numpy()[300:]
+    np.testing.assert_allclose(result, expected, rtol=1e-9)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from time_series.store import FeatureStore
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({'g': ['a', 'b', 'a'], 'x': [1.0, 2.0, np.nan], 'n': [1, 2, 3]},
+                        index=pd.Index([10, 11, 12], name='id'))
+
+
+def test_round_trip_and_append(tmp_path, data):
+    store = FeatureStore(str(tmp_path))
+    store.append(data, group_by=['g'])
+    more = pd.DataFrame({'g': ['c', 'a'], 'x': [4.0, 5.0], 'n': [4, 5]}, index=pd.Index([13, 14], name='id'))
+    store.append(more)
+
+    store = FeatureStore(str(tmp_path))
+    expected = pd.concat([data, more])
+    assert store.n_rows == 5
+    assert store.group_by == ['g']
+    pd.testing.assert_frame_equal(store.read(), expected.assign(g=pd.Categorical(expected['g'])))
+    pd.testing.assert_frame_equal(store.read(['x'], start=1, stop=4), expected[['x']].iloc[1:4])
+    # the new category is added behind the known ones, without changing the stored codes
+    assert store.categories('g') == ['a', 'b', 'c']
+    np.testing.assert_array_equal(store.column('g'), [0, 1, 0, 2, 0])
+    np.testing.assert_array_equal(store.column('n'), expected['n'])
+
+
+def test_dtype_mismatch(tmp_path, data):
+    store = FeatureStore(str(tmp_path))
+    store.append(data)
+    # ints are stored as floats without loss
+    store.append(data.assign(x=[1, 2, 3]).set_axis(data.index + 3))
+    with pytest.raises(Exception, match='without loss'):
+        store.append(data.assign(g=['z', 'z', 'z'], n=[1.5, 2.0, 3.0]))
+    assert store.categories('g') == ['a', 'b']
+    with pytest.raises(Exception, match='without loss'):
+        store.append(data.set_axis(data.index + 0.5))
+    with pytest.raises(Exception, match='do not match'):
+        store.append(data[['x', 'n']])
+    assert FeatureStore(str(tmp_path)).n_rows == 6
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from time_series.asof import AsOfIndex
+from time_series.avg import group_avg, group_last_k_avg, group_moment_avg, group_time_moment_avg
+from time_series.lag import group_lag
+from time_series.plan import Feature, FeaturePlan
+from time_series.stream import stream_features
+from time_series.sum import group_last_k_sum, group_sum
+
+
+def _frame(x, g):
+    return pd.DataFrame({'g': g, 'x': np.asarray(x, dtype=float)})
+
+
+@pytest.fixture
+def mixed():
+    # a group with an infinite value, a group with NaN, and a large group of large values before a small one
+    rng = np.random.default_rng(0)
+    n_big = 20000
+    g = np.concatenate([[1, 1, 1], [2, 2, 2, 2], np.full(n_big, 3), np.full(50, 4)])
+    x = np.concatenate([[np.inf, 1, 2], [1, np.nan, 3, -np.inf], 1e8 + rng.random(n_big) * 1e8,
+                        1e-3 * rng.random(50)])
+    order = rng.permutation(g.shape[0])
+    return _frame(x[order], g[order])
+
+
+@pytest.mark.parametrize('k', [1, 3])
+def test_group_last_k_sum_snapshot(mixed, k):
+    expected = mixed.groupby('g')[['x']].apply(lambda x: x.tail(k).sum(min_count=k))
+    result = group_last_k_sum(mixed, ['x'], k, ['g'], historical=False)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-9)
+
+
+@pytest.mark.parametrize('k', [1, 3])
+def test_group_last_k_avg_snapshot(mixed, k):
+    expected = mixed.groupby('g')[['x']].apply(lambda x: x.tail(k).mean())
+    result = group_last_k_avg(mixed, ['x'], k, ['g'], historical=False)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-9)
+
+
+def test_snapshot_infinite_value_stays_in_its_group():
+    result = group_last_k_sum(_frame([np.inf, 1, 1, 2, 3], [1, 1, 2, 2, 2]), ['x'], 2, ['g'], historical=False)
+    np.testing.assert_array_equal(result['x'].to_numpy(), [np.inf, 5.0])
+
+
+def _expected(df, func):
+    return df.groupby('g')['x'].transform(lambda s: func(s).shift(1)).to_numpy()
+
+
+@pytest.mark.parametrize('k', [1, 3, 10])
+def test_group_last_k_sum(mixed, k):
+    result = group_last_k_sum(mixed, ['x'], k, ['g'])
+    np.testing.assert_allclose(result['x'].to_numpy(), _expected(mixed, lambda s: s.rolling(k).sum()), rtol=1e-9)
+
+
+def test_group_last_k_sum_windows(mixed):
+    result = group_last_k_sum(mixed, ['x'], [2, 5], ['g'])
+    for k in (2, 5):
+        np.testing.assert_allclose(result[(k, 'x')].to_numpy(), _expected(mixed, lambda s: s.rolling(k).sum()),
+                                   rtol=1e-9)
+
+
+@pytest.mark.parametrize('k', [1, 3, 10])
+def test_group_last_k_avg(mixed, k):
+    result = group_last_k_avg(mixed, ['x'], k, ['g'])
+    expected = _expected(mixed, lambda s: s.rolling(k, min_periods=1).mean())
+    np.testing.assert_allclose(result['x'].to_numpy(), expected, rtol=1e-9)
+
+
+def test_group_last_k_avg_windows(mixed):
+    mixed = mixed.assign(y=-mixed['x'])
+    result = group_last_k_avg(mixed, ['x', 'y'], [2, 5, 1], ['g'])
+    for k in (2, 5, 1):
+        np.testing.assert_array_equal(result[k].to_numpy(), group_last_k_avg(mixed, ['x', 'y'], k, ['g']).to_numpy())
+
+
+def test_group_sum(mixed):
+    result = group_sum(mixed, ['x'], ['g'])
+    np.testing.assert_allclose(result['x'].to_numpy(), _expected(mixed, lambda s: s.expanding().sum()), rtol=1e-9)
+
+
+def test_group_avg(mixed):
+    result = group_avg(mixed, ['x'], ['g'])
+    np.testing.assert_allclose(result['x'].to_numpy(), _expected(mixed, lambda s: s.expanding().mean()), rtol=1e-9)
+
+
+def test_group_moment_avg(mixed):
+    result = group_moment_avg(mixed, ['x'], 0.3, ['g'])
+    expected = _expected(mixed, lambda s: s.ewm(alpha=0.3, adjust=False).mean())
+    np.testing.assert_allclose(result['x'].to_numpy(), expected, rtol=1e-9)
+
+
+def test_group_time_moment_avg(mixed):
+    mixed = mixed.assign(t=np.arange(mixed.shape[0], dtype=float))
+    result = group_time_moment_avg(mixed, ['x'], 5.0, 't', ['g'])
+    times = pd.to_datetime(mixed['t'], unit='D')
+    expected = mixed.groupby('g')['x'].transform(
+        lambda s: s.ewm(halflife='5 days', times=times[s.index]).mean().shift(1)).to_numpy()
+    np.testing.assert_allclose(result['x'].to_numpy(), expected, rtol=1e-9)
+
+
+def test_infinite_value_stays_in_its_group():
+    df = _frame([np.inf, 1, 1, 2, 3], [1, 1, 2, 2, 2])
+    np.testing.assert_array_equal(group_avg(df, ['x'], ['g'])['x'].to_numpy(), [np.nan, np.nan, np.nan, 1.0, 1.5])
+    np.testing.assert_array_equal(group_last_k_sum(df, ['x'], 1, ['g'])['x'].to_numpy(),
+                                  [np.nan, np.nan, np.nan, 1.0, 2.0])
+
+
+def test_small_group_after_large_group():
+    rng = np.random.default_rng(1)
+    big = 1e8 + rng.random(200000)
+    small = 1e-3 * (1 + rng.random(10))
+    df = _frame(np.concatenate([big, small]), np.repeat([1, 2], [big.shape[0], small.shape[0]]))
+    result = group_last_k_sum(df, ['x'], 3, ['g'])['x'].to_numpy()[-7:]
+    expected = np.convolve(small, np.ones(3), mode='valid')[:-1]
+    np.testing.assert_allclose(result, expected, rtol=1e-9)
+    np.testing.assert_allclose(group_avg(df, ['x'], ['g'])['x'].to_numpy()[-1], small[:-1].mean(), rtol=1e-9)
+
+
+@pytest.fixture
+def plan():
+    return FeaturePlan([
+        Feature(group_last_k_sum, cols=['x'], k=3),
+        Feature(group_last_k_avg, cols=['x'], k=3),
+        Feature(group_sum, cols=['x']),
+        Feature(group_avg, cols=['x']),
+        Feature(group_moment_avg, cols=['x'], alpha=0.3),
+        Feature(group_lag, cols=['x'], k=2),
+    ], group_by=['g'])
+
+
+def test_plan(mixed, plan):
+    result = plan.compute(mixed)
+    for f, func in zip(plan.features, [group_last_k_sum(mixed, ['x'], 3, ['g']),
+                                       group_last_k_avg(mixed, ['x'], 3, ['g']),
+                                       group_sum(mixed, ['x'], ['g']),
+                                       group_avg(mixed, ['x'], ['g']),
+                                       group_moment_avg(mixed, ['x'], 0.3, ['g']),
+                                       group_lag(mixed, 2, ['g'], cols=['x'])]):
+        np.testing.assert_array_equal(result[f.output_cols[0]].to_numpy(), func['x'].to_numpy())
+
+
+def test_plan_passes_saved(plan):
+    # one grouping of the data instead of one per feature
+    assert plan.passes_saved == 5
+    assert FeaturePlan(plan.features[:1], group_by=['g']).passes_saved == 0
+    assert FeaturePlan([], group_by=['g']).passes_saved == 0
+
+
+def test_plan_infinite_value_stays_in_its_group(plan):
+    result = plan.compute(_frame([np.inf, 1, 1, 2, 3], [1, 1, 2, 2, 2]))
+    np.testing.assert_array_equal(result['avg_x'].to_numpy(), [np.nan, np.nan, np.nan, 1.0, 1.5])
+
+
+def test_chunked_plan(mixed, plan):
+    expected = plan.compute(mixed)
+    result = pd.concat(stream_features((mixed.iloc[i:i + 3000] for i in range(0, mixed.shape[0], 3000)), plan))
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-9)
+
+
+def test_asof_index(mixed, plan):
+    mixed = mixed.assign(t=np.arange(mixed.shape[0]))
+    expected = plan.compute(mixed)
+    result = AsOfIndex(mixed, plan, 't').lookup(mixed[['g']], mixed['t'])
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-9)
+
+
+def test_group_time_moment_avg_tz_aware(mixed):
+    times = pd.Series(pd.date_range('2024-01-01', periods=mixed.shape[0], freq='H', tz='Europe/London'),
+                      index=mixed.index)
+    expected = group_time_moment_avg(mixed.assign(t=times.dt.tz_convert(None)), ['x'], '1 day', 't', ['g'])
+    result = group_time_moment_avg(mixed.assign(t=times), ['x'], '1 day', 't', ['g'])
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_group_time_moment_avg_missing_time():
+    df = pd.DataFrame({'g': [1, 1, 1], 'x': [1.0, 2.0, 3.0],
+                       't': pd.to_datetime(['2024-01-01', None, '2024-01-03'])})
+    with pytest.raises(Exception, match='missing times'):
+        group_time_moment_avg(df, ['x'], '1 day', 't', ['g'])
@@ -0,0 +1,44 @@
+"""
+Historical features of time series data. The functions and classes are loaded from their modules on first access,
+    so importing the package imports neither pandas nor numba. avg, count, form and lag share their names with
+    their modules and are imported from them, e.g. from time_series.avg import avg.
+"""
+import importlib
+
+_EXPORTS = {
+    'sum': ['last_k_sum', 'group_last_k_sum', 'cum_sum', 'group_sum', 'group_sum_index'],
+    'avg': ['last_k_avg', 'group_last_k_avg', 'group_avg', 'moment_avg', 'group_moment_avg',
+            'group_time_moment_avg'],
+    'count': ['last_k_count', 'group_last_k_count', 'group_count', 'group_category_count_index'],
+    'diff': ['last_k_diff_sum', 'group_last_k_diff_sum', 'last_k_diff_avg', 'group_last_k_diff_avg'],
+    'lag': ['group_lag', 'group_lags'],
+    'streak': ['weighted_last_k', 'weight_streak'],
+    'grouping': ['Grouping'],
+    'online': ['GroupState', 'LastKSumState', 'LastKAvgState', 'SumState', 'AvgState', 'MomentAvgState', 'LagState'],
+    'plan': ['Feature', 'FeaturePlan'],
+    'stream': ['ChunkedPlan', 'stream_features'],
+    'team': ['melt_teams', 'team_features'],
+    'asof': ['AsOfIndex'],
+    'encoder': ['CategoryEncoder'],
+    'store': ['FeatureStore'],
+    'cache': ['ResultCache', 'fingerprint'],
+    'parallel': ['shard_apply'],
+    'instrument': ['Recorder', 'register_hook', 'remove_hook'],
+    'progress': ['Progress', 'TqdmCallback', 'register_callback', 'remove_callback'],
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name: str):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,446 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+# numba.njit, None when numba is not installed, False until it is first needed
+_njit = False
+
+
+def _numba_njit():
+    global _njit
+    if _njit is False:
+        try:
+            from numba import njit as _njit
+        except ImportError:
+            _njit = None
+    return _njit
+
+
+def jit(func):
+    """
+    Compile a sequential kernel with numba when it is installed, otherwise run it as plain python. The kernel is
+        compiled on its first call, so that importing the package does not import numba.
+    :param func: the kernel working on numpy arrays
+    :return: the kernel, compiled on its first call
+    """
+    compiled = []
+
+    @functools.wraps(func)
+    def kernel(*args):
+        if not compiled:
+            njit = _numba_njit()
+            compiled.append(func if njit is None else njit(cache=True)(func))
+        return compiled[0](*args)
+
+    return kernel
+
+
+def asof_positions(codes: np.ndarray, values: np.ndarray, query_codes: np.ndarray,
+                   query_values: np.ndarray) -> np.ndarray:
+    """
+    Find, for every query, the last record of the same group whose value is not greater than the query value.
+    :param codes: the group codes of the records, sorted together with values
+    :param values: the values of the records, sorted within each group
+    :param query_codes: the group codes of the queries
+    :param query_values: the values of the queries
+    :return: the positions of the matched records, -1 if there is none
+    """
+    n = codes.shape[0]
+    all_codes = np.concatenate([codes, query_codes])
+    all_values = np.concatenate([values, query_values])
+    # records are ordered before queries with the same value, so that a record at the query value is included
+    kind = np.concatenate([np.zeros(n, dtype=np.int8), np.ones(query_codes.shape[0], dtype=np.int8)])
+    order = np.lexsort((kind, all_values, all_codes))
+
+    last = np.maximum.accumulate(np.where(order < n, order, -1)) if order.shape[0] else order
+    is_query = order >= n
+    pos = last[is_query]
+    query_pos = order[is_query] - n
+    matched = pos >= 0
+    matched[matched] = codes[pos[matched]] == query_codes[query_pos[matched]]
+
+    result = np.full(query_codes.shape[0], -1, dtype=np.int64)
+    result[query_pos[matched]] = pos[matched]
+    return result
+
+
+def tail_sums(values: np.ndarray, offsets: np.ndarray, k: int):
+    """
+    Sum and number of observations of the last k records of each group, summed group by group, the same as
+        tail(k).sum() per group: NaN is skipped and an infinite value makes the sum infinite.
+    :param values: the group-sorted values, one column per feature
+    :param offsets: the group offsets, with the total number of records as the last element
+    :param k: the number of last k records
+    :return: the sums and the numbers of observations of the last min(k, size) records of each group
+    """
+    end = offsets[1:]
+    begin = np.maximum(offsets[:-1], end - k)
+    sizes = end - begin
+    tail_offsets = np.concatenate([[0], np.cumsum(sizes)])
+    rows = np.arange(tail_offsets[-1]) + np.repeat(begin - tail_offsets[:-1], sizes)
+    tail = values[rows]
+    observed = ~np.isnan(tail)
+
+    sums = np.zeros((end.shape[0],) + values.shape[1:])
+    counts = np.zeros((end.shape[0],) + values.shape[1:])
+    has = sizes > 0
+    if has.any():
+        sums[has] = np.add.reduceat(np.where(observed, tail, 0.0), tail_offsets[:-1][has], axis=0)
+        counts[has] = np.add.reduceat(observed, tail_offsets[:-1][has], axis=0)
+    return sums, counts
+
+
+def window_bounds(starts: np.ndarray, k=None):
+    """
+    The window of the last k records before each record within its group.
+    :param starts: the group start of every group-sorted record
+    :param k: the number of last k records. If None, all the previous records of the group
+    :return: the first record of every window and the record after its last one
+    """
+    end = np.arange(starts.shape[0])
+    begin = starts if k is None else np.maximum(starts, end - k)
+    return begin, end
+
+
+@jit
+def _range_sums_loop(values: np.ndarray, begin: np.ndarray, end: np.ndarray, order: np.ndarray):
+    sums = np.zeros((begin.shape[0], values.shape[1]))
+    counts = np.zeros((begin.shape[0], values.shape[1]))
+    for c in range(values.shape[1]):
+        lo = 0
+        hi = 0
+        total = 0.0
+        compensation = 0.0
+        n_obs = 0
+        for j in range(order.shape[0]):
+            q = order[j]
+            b = begin[q]
+            e = end[q]
+            if b < lo or e < hi or b >= hi:
+                # the window does not slide from the previous one, start again from an empty window
+                lo = b
+                hi = b
+                total = 0.0
+                compensation = 0.0
+                n_obs = 0
+            while hi < e:
+                val = values[hi, c]
+                if val - val == 0.0:
+                    n_obs += 1
+                    y = val - compensation
+                    t = total + y
+                    compensation = t - total - y
+                    total = t
+                hi += 1
+            while lo < b:
+                val = values[lo, c]
+                if val - val == 0.0:
+                    n_obs -= 1
+                    if n_obs == 0:
+                        total = 0.0
+                        compensation = 0.0
+                    else:
+                        y = -val - compensation
+                        t = total + y
+                        compensation = t - total - y
+                        total = t
+                lo += 1
+            sums[q, c] = total
+            counts[q, c] = n_obs
+    return sums, counts
+
+
+@jit
+def _cumulative_sums_loop(values: np.ndarray, offsets: np.ndarray):
+    sums = np.zeros(values.shape)
+    counts = np.zeros(values.shape)
+    for c in range(values.shape[1]):
+        for g in range(offsets.shape[0] - 1):
+            total = 0.0
+            compensation = 0.0
+            n_obs = 0
+            for i in range(offsets[g], offsets[g + 1]):
+                val = values[i, c]
+                if val - val == 0.0:
+                    n_obs += 1
+                    y = val - compensation
+                    t = total + y
+                    compensation = t - total - y
+                    total = t
+                sums[i, c] = total
+                counts[i, c] = n_obs
+    return sums, counts
+
+
+def cumulative_sums(values: np.ndarray, offsets: np.ndarray):
+    """
+    Sum and number of observations of the group-sorted records from the start of the group to every record,
+        restarting at every group. Infinite values are not observations, as in range_sums.
+    :param values: the group-sorted values, one column per feature
+    :param offsets: the group offsets, with the total number of records as the last element
+    :return: the cumulated sums and the cumulated numbers of observations, including each record
+    """
+    if _numba_njit() is not None:
+        return _cumulative_sums_loop(values, offsets)
+    observed = np.isfinite(values)
+    codes = np.repeat(np.arange(offsets.shape[0] - 1), np.diff(offsets))
+    sums = pd.DataFrame(np.where(observed, values, 0.0)).groupby(codes, sort=False).cumsum().to_numpy()
+    counts = pd.DataFrame(observed.astype(float)).groupby(codes, sort=False).cumsum().to_numpy()
+    return sums.reshape(values.shape), counts.reshape(values.shape)
+
+
+def _segment_sums(values: np.ndarray, offsets: np.ndarray, begin: np.ndarray, end: np.ndarray):
+    # without numba: cumulated sums restarting at every group, differenced within the group
+    cum_sums, cum_counts = cumulative_sums(values, offsets)
+    start = offsets[np.searchsorted(offsets, begin, side='right') - 1]
+
+    def before(cum, pos):
+        result = np.zeros((pos.shape[0],) + values.shape[1:])
+        inside = pos > start
+        result[inside] = cum[pos[inside] - 1]
+        return result
+
+    empty = (end <= begin)[:, None]
+    sums = np.where(empty, 0.0, before(cum_sums, end) - before(cum_sums, begin))
+    counts = np.where(empty, 0.0, before(cum_counts, end) - before(cum_counts, begin))
+    return sums, counts
+
+
+def range_sums(values: np.ndarray, offsets: np.ndarray, begin: np.ndarray, end: np.ndarray):
+    """
+    Sum and number of observations of the group-sorted records from begin to end for every window, each window
+        being within one group. The sums slide from one window to the next with compensated additions and
+        removals, as rolling().sum() does, and start again at every group, so a group never depends on another
+        one. Infinite values are not observations, as in rolling, expanding and ewm.
+    :param values: the group-sorted values, one column per feature
+    :param offsets: the group offsets, with the total number of records as the last element
+    :param begin: the first record of every window
+    :param end: the record after the last one of every window
+    :return: the window sums and the window numbers of observations
+    """
+    begin = np.asarray(begin, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    if _numba_njit() is None:
+        return _segment_sums(values, offsets, begin, end)
+    if np.all(end[1:] >= end[:-1]) and np.all(begin[1:] >= begin[:-1]):
+        order = np.arange(begin.shape[0])
+    else:
+        order = np.lexsort((begin, end))
+    return _range_sums_loop(values, begin, end, order)
+
+
+@jit
+def _last_k_sums_loop(values: np.ndarray, starts: np.ndarray, ks: np.ndarray):
+    n_ks = ks.shape[0]
+    sums = np.zeros((values.shape[0], n_ks, values.shape[1]))
+    counts = np.zeros((values.shape[0], n_ks, values.shape[1]))
+    total = np.zeros(n_ks)
+    compensation = np.zeros(n_ks)
+    n_obs = np.zeros(n_ks, dtype=np.int64)
+    for c in range(values.shape[1]):
+        for i in range(values.shape[0]):
+            if i == starts[i]:
+                # a new group starts with empty windows
+                total[:] = 0.0
+                compensation[:] = 0.0
+                n_obs[:] = 0
+            else:
+                val = values[i - 1, c]
+                observed = val - val == 0.0
+                for j in range(n_ks):
+                    if observed:
+                        n_obs[j] += 1
+                        y = val - compensation[j]
+                        t = total[j] + y
+                        compensation[j] = t - total[j] - y
+                        total[j] = t
+                    old = i - 1 - ks[j]
+                    if old >= starts[i]:
+                        val_old = values[old, c]
+                        if val_old - val_old == 0.0:
+                            n_obs[j] -= 1
+                            if n_obs[j] == 0:
+                                total[j] = 0.0
+                                compensation[j] = 0.0
+                            else:
+                                y = -val_old - compensation[j]
+                                t = total[j] + y
+                                compensation[j] = t - total[j] - y
+                                total[j] = t
+            for j in range(n_ks):
+                sums[i, j, c] = total[j]
+                counts[i, j, c] = n_obs[j]
+    return sums, counts
+
+
+def last_k_sums(values: np.ndarray, offsets: np.ndarray, starts: np.ndarray, ks: np.ndarray):
+    """
+    Sum and number of observations of the last k records before each record within its group for several k in one
+        sweep over the group-sorted records, each window sliding as in range_sums.
+    :param values: the group-sorted values, one column per feature
+    :param offsets: the group offsets, with the total number of records as the last element
+    :param starts: the group start of every group-sorted record
+    :param ks: the numbers of last k records
+    :return: the window sums and the window numbers of observations, shaped (records, ks, columns)
+    """
+    ks = np.asarray(ks, dtype=np.int64)
+    if _numba_njit() is None:
+        results = [range_sums(values, offsets, *window_bounds(starts, w)) for w in ks]
+        return np.stack([s for s, _ in results], axis=1), np.stack([c for _, c in results], axis=1)
+    return _last_k_sums_loop(values, np.asarray(starts, dtype=np.int64), ks)
+
+
+def sum_or_nan(sums: np.ndarray, counts: np.ndarray, min_count: int = 1) -> np.ndarray:
+    """
+    Window sums, NaN for the windows with fewer than min_count observations.
+    :param sums: the window sums
+    :param counts: the window numbers of observations
+    :param min_count: the minimal number of observations in the window
+    :return: the window sums
+    """
+    return np.where(counts >= max(min_count, 1), sums, np.nan)
+
+
+def mean_or_nan(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Window averages, NaN for the windows without observation.
+    :param sums: the window sums
+    :param counts: the window numbers of observations
+    :return: the window averages
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def window_sum(values: np.ndarray, offsets: np.ndarray, begin: np.ndarray, end: np.ndarray,
+               min_count: int = 1) -> np.ndarray:
+    """
+    Sum of the group-sorted records from begin to end for every window, the same as rolling(k, min_count).sum()
+        over the last k records or expanding().sum() over all the previous records of a group.
+    :param values: the group-sorted values, one column per feature
+    :param offsets: the group offsets, with the total number of records as the last element
+    :param begin: the first record of every window
+    :param end: the record after the last one of every window
+    :param min_count: the minimal number of observations in the window, NaN below it
+    :return: the window sums
+    """
+    return sum_or_nan(*range_sums(values, offsets, begin, end), min_count=min_count)
+
+
+def window_mean(values: np.ndarray, offsets: np.ndarray, begin: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """
+    Average of the group-sorted records from begin to end for every window, NaN without observation.
+    :param values: the group-sorted values, one column per feature
+    :param offsets: the group offsets, with the total number of records as the last element
+    :param begin: the first record of every window
+    :param end: the record after the last one of every window
+    :return: the window averages
+    """
+    return mean_or_nan(*range_sums(values, offsets, begin, end))
+
+
+def shift(values: np.ndarray, positions: np.ndarray, k: int) -> np.ndarray:
+    """
+    Shift the group-sorted values by k records within each group.
+    :param values: the group-sorted values
+    :param positions: the position within the group of every group-sorted record
+    :param k: the number of records to shift
+    :return: the shifted values, NaN for the first k records of every group
+    """
+    result = np.full(values.shape, np.nan)
+    rows = np.flatnonzero(positions >= k)
+    result[rows] = values[rows - k]
+    return result
+
+
+@jit
+def _ewm_mean_loop(values: np.ndarray, offsets: np.ndarray, alpha: float, weighted_state: np.ndarray,
+                   old_wt_state: np.ndarray) -> np.ndarray:
+    result = np.empty(values.shape)
+    for g in range(offsets.shape[0] - 1):
+        for c in range(values.shape[1]):
+            weighted = weighted_state[g, c]
+            old_wt = old_wt_state[g, c]
+            for i in range(offsets[g], offsets[g + 1]):
+                cur = values[i, c]
+                if cur - cur != 0.0:
+                    # NaN and infinite values are missing, as in ewm
+                    cur = np.nan
+                if weighted == weighted:
+                    old_wt *= 1.0 - alpha
+                    if cur == cur:
+                        if weighted != cur:
+                            weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                        old_wt = 1.0
+                elif cur == cur:
+                    weighted = cur
+                result[i, c] = weighted
+            weighted_state[g, c] = weighted
+            old_wt_state[g, c] = old_wt
+    return result
+
+
+def ewm_state(n_groups: int, n_cols: int):
+    """
+    The state of ewm_mean before the first record of every group.
+    :param n_groups: the number of groups
+    :param n_cols: the number of columns
+    :return: the weighted averages and the weights of the old averages
+    """
+    return np.full((n_groups, n_cols), np.nan), np.ones((n_groups, n_cols))
+
+
+def ewm_mean(values: np.ndarray, offsets: np.ndarray, alpha: float, state=None) -> np.ndarray:
+    """
+    Exponential weighted average of the group-sorted values, the same as ewm(alpha, adjust=False).mean() per group.
+    :param values: the group-sorted values, one column per feature
+    :param offsets: the group offsets, with the total number of records as the last element
+    :param alpha: smoothing factor, 0 < alpha <= 1
+    :param state: the state from ewm_state to start from, updated in place to the state after the last record
+        of every group. If None, every group starts from scratch
+    :return: the exponential weighted average including each record
+    """
+    if state is None:
+        if _numba_njit() is None:
+            # the pure python loop is slow, the compiled pandas ewm gives the same result group by group
+            codes = np.repeat(np.arange(offsets.shape[0] - 1), np.diff(offsets))
+            return pd.DataFrame(values).groupby(codes, sort=False).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+        state = ewm_state(offsets.shape[0] - 1, values.shape[1])
+    return _ewm_mean_loop(values, offsets, alpha, state[0], state[1])
+
+
+@jit
+def _ewm_time_mean_loop(values: np.ndarray, times: np.ndarray, offsets: np.ndarray, halflife: float) -> np.ndarray:
+    result = np.empty(values.shape)
+    for g in range(offsets.shape[0] - 1):
+        for c in range(values.shape[1]):
+            weighted = np.nan
+            old_wt = 1.0
+            for i in range(offsets[g], offsets[g + 1]):
+                cur = values[i, c]
+                if cur - cur != 0.0:
+                    cur = np.nan
+                if weighted == weighted:
+                    old_wt *= 0.5 ** ((times[i] - times[i - 1]) / halflife)
+                    if cur == cur:
+                        if weighted != cur:
+                            weighted = (old_wt * weighted + cur) / (old_wt + 1.0)
+                        old_wt += 1.0
+                elif cur == cur:
+                    weighted = cur
+                result[i, c] = weighted
+    return result
+
+
+def ewm_time_mean(values: np.ndarray, times: np.ndarray, offsets: np.ndarray, halflife: float) -> np.ndarray:
+    """
+    Exponential weighted average of the group-sorted values decaying by the elapsed time, the same as
+        ewm(halflife=halflife, times=times).mean() per group: a record observed dt before weighs 0.5 ** (dt / halflife).
+    :param values: the group-sorted values, one column per feature
+    :param times: the group-sorted record times as numbers, not decreasing within each group
+    :param offsets: the group offsets, with the total number of records as the last element
+    :param halflife: the time for a weight to halve, in the unit of times
+    :return: the exponential weighted average including each record
+    """
+    return _ewm_time_mean_loop(values, times.astype(float), offsets, float(halflife))
@@ -0,0 +1,99 @@
+from typing import Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from . import _kernels
+from .avg import group_avg, group_moment_avg
+from .grouping import Grouping
+from .plan import FeaturePlan
+from .sum import group_sum
+
+
+class AsOfIndex:
+    """
+    Point-in-time lookup of the historical features of a FeaturePlan. The records of every group are sorted by time,
+        and the moment averages and the sums and numbers of observations from the start of the group to every record
+        are calculated once. The history of a lookup is found with a binary search, after which the expanding and
+        moment features are read at its end and the last k windows are summed over at most k records each.
+    :param df_data: input data, the history
+    :param plan: the features to look up
+    :param time_col: the name of the column containing the record times. Within a group, the records are ordered
+        by time, keeping the record order for equal times
+    """
+
+    def __init__(self, df_data: pd.DataFrame, plan: FeaturePlan, time_col: str):
+        self.plan = plan
+        self.group_by = list(plan.group_by) if plan.group_by else []
+        grouping = Grouping(df_data, self.group_by)
+        self.keys = grouping.keys if self.group_by else pd.RangeIndex(grouping.n_groups)
+        self.offsets = grouping.offsets
+
+        order = np.lexsort((df_data[time_col].to_numpy(), grouping.codes))[:grouping.n_valid]
+        self.times = df_data[time_col].to_numpy()[order]
+        # the times are replaced by their ranks, so that (group, time) is searched as one sorted integer key
+        self._unique_times, ranks = np.unique(self.times, return_inverse=True)
+        codes = np.repeat(np.arange(grouping.n_groups, dtype=np.int64), grouping.sizes)
+        self._search_keys = codes * (self._unique_times.shape[0] + 1) + ranks
+
+        cols = list(dict.fromkeys(c for f in plan.features for c in f.input_cols))
+        self._col_pos = {c: i for i, c in enumerate(cols)}
+        self.values = df_data[cols].to_numpy(dtype=float)[order]
+        self._values = [self.values[:, [self._col_pos[c] for c in f.input_cols]] for f in plan.features]
+        # the moment average and the cumulated sums including each record
+        self._ewm = {i: _kernels.ewm_mean(self._values[i], self.offsets, f.kwargs['alpha'])
+                     for i, f in enumerate(plan.features) if f.func is group_moment_avg}
+        self._cumulative = {i: _kernels.cumulative_sums(self._values[i], self.offsets)
+                            for i, f in enumerate(plan.features) if f.func in (group_sum, group_avg)}
+
+    def _expanding(self, i: int, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        # the cumulated sums at the last record of every history, zero for the empty ones
+        cum_sums, cum_counts = self._cumulative[i]
+        sums = np.zeros((end.shape[0], cum_sums.shape[1]))
+        counts = np.zeros((end.shape[0], cum_sums.shape[1]))
+        inside = end > start
+        sums[inside] = cum_sums[end[inside] - 1]
+        counts[inside] = cum_counts[end[inside] - 1]
+        if self.plan.features[i].func is group_sum:
+            return _kernels.sum_or_nan(sums, counts)
+        return _kernels.mean_or_nan(sums, counts)
+
+    def lookup(self, keys: Union[pd.DataFrame, Sequence], times: Sequence, inclusive: bool = False) -> pd.DataFrame:
+        """
+        This function is to look up the features that a new record of each group would get at each time
+        :param keys: the groups, a DataFrame with the group_by columns or a sequence of keys (tuples for more than
+            one group_by column). Ignored without group_by
+        :param times: the times, one per key
+        :param inclusive: If True, the records at the time are part of the history, otherwise only the earlier ones
+        :return: the features, aligned to keys if it is a DataFrame. The groups not in the history get the
+            features of a group without records
+        """
+        times = np.asarray(times).astype(self.times.dtype)
+        n = times.shape[0]
+        if not self.group_by:
+            codes = np.zeros(n, dtype=np.int64) if self.keys.shape[0] else np.full(n, -1, dtype=np.int64)
+        elif isinstance(keys, pd.DataFrame):
+            if len(self.group_by) > 1:
+                query_keys = pd.MultiIndex.from_frame(keys[self.group_by])
+            else:
+                query_keys = pd.Index(keys[self.group_by[0]])
+            codes = self.keys.get_indexer(query_keys)
+        else:
+            query_keys = pd.MultiIndex.from_tuples(keys) if len(self.group_by) > 1 else pd.Index(keys)
+            codes = self.keys.get_indexer(query_keys)
+
+        # the number of records of the group before the time
+        rank = np.searchsorted(self._unique_times, times, side='right' if inclusive else 'left')
+        found = codes >= 0
+        codes = np.where(found, codes, 0)
+        end = np.searchsorted(self._search_keys, codes * (self._unique_times.shape[0] + 1) + rank, side='left')
+        start = self.offsets[codes]
+        end = np.where(found, end, start)
+
+        results = [self._expanding(i, start, end) if i in self._cumulative
+                   else FeaturePlan._evaluate(f, self._values[i], self.offsets, start, end, self._ewm.get(i))
+                   for i, f in enumerate(self.plan.features)]
+        result = np.hstack(results) if results else np.empty((n, 0))
+        columns = [c for f in self.plan.features for c in f.output_cols]
+        index = keys.index if isinstance(keys, pd.DataFrame) else None
+        return pd.DataFrame(result, columns=columns, index=index)
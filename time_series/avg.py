@@ -1,9 +1,13 @@
-from typing import List
+from typing import List, Optional, Sequence, Union
+import numpy as np
 import pandas as pd
 
-from .lag import group_lag
+from . import _kernels
+from .grouping import Grouping
+from .instrument import instrumented
 
 
+@instrumented
 def last_k_avg(df_data: pd.DataFrame, cols: List[str], k: int, historical: bool = True) -> pd.DataFrame:
     """
     This function is to calculate the average of data
@@ -20,27 +24,40 @@ def last_k_avg(df_data: pd.DataFrame, cols: List[str], k: int, historical: bool
         return df_data[cols].tail(k).mean(axis=0).to_frame().transpose()
 
 
-def group_last_k_avg(df_data: pd.DataFrame, cols: List[str], k: int, group_by: List[str],
-                     historical: bool = True) -> pd.DataFrame:
+@instrumented
+def group_last_k_avg(df_data: pd.DataFrame, cols: List[str], k: Union[int, Sequence[int]], group_by: List[str],
+                     historical: bool = True, grouping: Optional[Grouping] = None) -> pd.DataFrame:
     """
     This function is to calculate the average of data within groups
     :param df_data: input data
     :param cols: the columns for average calculation
-    :param k: the number of last k records
+    :param k: the number of last k records. If a list of values is given, all of them are evaluated in one sweep
+        over the group-sorted values and the columns of the result are indexed by k first
     :param group_by: the columns for dividing the data into groups
     :param historical: If True, return the average of the last k records for each actual record within each group.
         If False, only return the average of the last k records of the data within each group
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
     :return: the result of the average calculation within groups
     """
+    ks = np.atleast_1d(np.asarray(k, dtype=np.int64))
+    if grouping is None:
+        grouping = Grouping(df_data, group_by)
+    values = grouping.sort(df_data[cols].to_numpy(dtype=float))
+    columns = pd.MultiIndex.from_product([ks, cols], names=['k', None]) if np.ndim(k) > 0 else cols
     if historical:
-        df_result: pd.DataFrame = df_data \
-                                      .groupby(group_by)[cols].rolling(k, min_periods=1).mean()
-        df_result = group_lag(df_result, k=1, group_by=group_by, historical=True, resort_index=df_data.index)
-        return df_result
+        sums, counts = _kernels.last_k_sums(values, grouping.offsets, grouping.starts, ks)
+        result = np.hstack([_kernels.mean_or_nan(sums[:, j], counts[:, j]) for j in range(ks.shape[0])])
+        return pd.DataFrame(grouping.scatter(result), columns=columns, index=df_data.index)
     else:
-        return df_data.groupby(group_by)[cols].apply(lambda x: x.tail(k).mean(axis=0))
+        results = []
+        for w in ks:
+            s, c = _kernels.tail_sums(values, grouping.offsets, w)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                results.append(np.where(c > 0, s / c, np.nan))
+        return pd.DataFrame(np.hstack(results), columns=columns, index=grouping.keys)
 
 
+@instrumented
 def avg(df_data: pd.DataFrame, cols: List[str], historical: bool = True) -> pd.DataFrame:
     """
     This function is to calculate the average of data
@@ -56,8 +73,9 @@ def avg(df_data: pd.DataFrame, cols: List[str], historical: bool = True) -> pd.D
         return df_data[cols].mean(axis=0)
 
 
+@instrumented
 def group_avg(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
-              historical: bool = True) -> pd.DataFrame:
+              historical: bool = True, grouping: Optional[Grouping] = None) -> pd.DataFrame:
     """
     This function is to calculate the average of data within groups
     :param df_data: input data
@@ -65,17 +83,20 @@ def group_avg(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
     :param group_by: the columns for dividing the data into groups
     :param historical:If True, return the average of the previous records for each actual record within each group.
         If False, only return the average of all of the data within each group
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
     :return: the result of the average calculation within groups
     """
     if historical:
-        df_result: pd.DataFrame = df_data \
-                                      .groupby(group_by)[cols].expanding().mean()
-        df_result = group_lag(df_result, k=1, group_by=group_by, historical=True, resort_index=df_data.index)
-        return df_result
+        if grouping is None:
+            grouping = Grouping(df_data, group_by)
+        values = grouping.sort(df_data[cols].to_numpy(dtype=float))
+        result = _kernels.window_mean(values, grouping.offsets, *_kernels.window_bounds(grouping.starts))
+        return pd.DataFrame(grouping.scatter(result), columns=cols, index=df_data.index)
     else:
         return df_data.groupby(group_by)[cols].mean()
 
 
+@instrumented
 def moment_avg(df_data: pd.DataFrame, cols: List[str], alpha: float, historical: bool = True) -> pd.DataFrame:
     """
     This function is to calculate the moment average of data using exponential weighted (EW) functions.
@@ -92,8 +113,9 @@ def moment_avg(df_data: pd.DataFrame, cols: List[str], alpha: float, historical:
         return df_data[cols].ewm(alpha=alpha, adjust=False).mean().tail(1).reset_index(drop=True)
 
 
+@instrumented
 def group_moment_avg(df_data: pd.DataFrame, cols: List[str], alpha: float, group_by: List[str],
-                     historical: bool = True) -> pd.DataFrame:
+                     historical: bool = True, grouping: Optional[Grouping] = None) -> pd.DataFrame:
     """
     This function is to calculate the moment average of data within groups using exponential weighted (EW) functions.
     :param df_data: input data
@@ -102,15 +124,57 @@ def group_moment_avg(df_data: pd.DataFrame, cols: List[str], alpha: float, group
     :param group_by: the columns for dividing the data into groups
     :param historical: If True, return the moment average of the previous records for each actual record.
         If False, only return the moment average of all the data
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
     :return: the result of the moment average calculation within groups
     """
     if historical:
-        df_result = df_data \
-                   .groupby(group_by)[cols].ewm(alpha=alpha, adjust=False).mean()
-        df_result = group_lag(df_result, k=1, group_by=group_by, historical=True, resort_index=df_data.index)
-        return df_result
+        if grouping is None:
+            grouping = Grouping(df_data, group_by)
+        values = _kernels.ewm_mean(grouping.sort(df_data[cols].to_numpy(dtype=float)), grouping.offsets, alpha)
+        return pd.DataFrame(grouping.lag(values), columns=cols, index=df_data.index)
 
     else:
         return df_data \
             .groupby(group_by)[cols].ewm(alpha=alpha, adjust=False).mean() \
             .groupby(group_by).tail(1).reset_index(1, drop=True)
+
+
+@instrumented
+def group_time_moment_avg(df_data: pd.DataFrame, cols: List[str], halflife, time_col: str, group_by: List[str],
+                          historical: bool = True, grouping: Optional[Grouping] = None) -> pd.DataFrame:
+    """
+    This function is to calculate the moment average of data within groups decaying by the time elapsed between the
+        records, a record dt before weighing 0.5 ** (dt / halflife), the same as ewm(halflife, times).mean()
+    :param df_data: input data
+    :param cols: the columns for the moment average calculation
+    :param halflife: the time for a weight to halve, e.g. '7 days' or a pd.Timedelta for datetime times, or a
+        number in the unit of numeric times
+    :param time_col: the name of the column containing the record times, not missing and not decreasing within each
+        group
+    :param group_by: the columns for dividing the data into groups
+    :param historical: If True, return the moment average of the previous records for each actual record.
+        If False, only return the moment average of all the data within each group
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
+    :return: the result of the moment average calculation within groups
+    """
+    if grouping is None:
+        grouping = Grouping(df_data, group_by)
+    times = df_data[time_col]
+    if times.isna().any():
+        raise Exception("{} should not contain missing times".format(time_col))
+    if pd.api.types.is_datetime64_any_dtype(times):
+        if times.dt.tz is not None:
+            times = times.dt.tz_convert(None)
+        times = grouping.sort(times.to_numpy().view(np.int64)).astype(float)
+        halflife = pd.Timedelta(halflife).value
+    else:
+        times = grouping.sort(times.to_numpy(dtype=float))
+    if np.any((np.diff(times) < 0) & (grouping.positions[1:] > 0)):
+        raise Exception("{} should not decrease within a group".format(time_col))
+
+    values = _kernels.ewm_time_mean(grouping.sort(df_data[cols].to_numpy(dtype=float)), times, grouping.offsets,
+                                    halflife)
+    if historical:
+        return pd.DataFrame(grouping.lag(values), columns=cols, index=df_data.index)
+    else:
+        return pd.DataFrame(values[grouping.offsets[1:] - 1], columns=cols, index=grouping.keys)
@@ -0,0 +1,265 @@
+import datetime
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .encoder import CategoryEncoder
+from .grouping import Grouping
+from .plan import Feature
+
+# the plain values hashed by their repr, which does not depend on the object identity
+_PLAIN = (str, bytes, bool, int, float, complex, type(None), np.generic, pd.Timestamp, pd.Timedelta,
+          datetime.date, datetime.timedelta)
+
+
+def _update_frame(h, df_data: pd.DataFrame, columns) -> None:
+    h.update(b'frame')
+    _update(h, df_data.index)
+    for name in columns:
+        _update(h, name)
+        _update(h, df_data[name])
+
+
+def _update(h, value: Any) -> None:
+    if isinstance(value, pd.DataFrame):
+        _update_frame(h, value, value.columns)
+    elif isinstance(value, (pd.Series, pd.Index)):
+        h.update(str(value.dtype).encode())
+        h.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update('{}{}'.format(value.dtype, value.shape).encode())
+        h.update(np.ascontiguousarray(value).tobytes() if value.dtype.kind != 'O' else repr(value.tolist()).encode())
+    elif isinstance(value, (list, tuple)):
+        h.update('{}{}'.format(type(value).__name__, len(value)).encode())
+        for v in value:
+            _update(h, v)
+    elif isinstance(value, (set, frozenset)):
+        h.update('set{}'.format(len(value)).encode())
+        for v in sorted(value, key=repr):
+            _update(h, v)
+    elif isinstance(value, dict):
+        h.update('dict{}'.format(len(value)).encode())
+        for k in sorted(value, key=repr):
+            _update(h, k)
+            _update(h, value[k])
+    elif isinstance(value, Feature):
+        h.update(b'Feature')
+        _update(h, [value.func, value.name, value.kwargs])
+    elif isinstance(value, CategoryEncoder):
+        h.update(b'CategoryEncoder')
+        _update(h, value.to_dict())
+    elif callable(value):
+        h.update('{}.{}'.format(value.__module__, value.__qualname__).encode())
+    elif isinstance(value, _PLAIN):
+        h.update('{}:{!r}'.format(type(value).__name__, value).encode())
+    else:
+        raise TypeError("cannot fingerprint a {} by its content".format(type(value).__name__))
+
+
+def fingerprint(value: Any) -> str:
+    """
+    This function is to hash data and arguments by their content
+    :param value: a DataFrame, Series, numpy array, Feature, CategoryEncoder or a (nested) list, tuple, set or dict
+        of them and plain values
+    :return: the hex digest, equal for equal contents. A TypeError is raised for other objects, whose content
+        is not known
+    """
+    h = hashlib.blake2b(digest_size=20)
+    _update(h, value)
+    return h.hexdigest()
+
+
+def _names(value: Any, names: set) -> None:
+    # every hashable value given in the arguments of a call, among which the names of the columns it reads
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index, np.ndarray)):
+        return
+    try:
+        names.add(value)
+    except TypeError:
+        pass
+    if isinstance(value, (list, tuple, set)):
+        for v in value:
+            _names(v, names)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            _names(k, names)
+            _names(v, names)
+    elif hasattr(value, 'input_cols'):
+        _names(value.input_cols, names)
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=False)))
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _copy(value: Any) -> Any:
+    # callers get their own copy, so that changing a result does not change the cached one
+    return value.copy() if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)) else value
+
+
+class ResultCache:
+    """
+    Memoization of the public functions, keyed on the content of the input columns plus the call arguments, so a
+        repeated call costs a hash of the columns it reads instead of a recomputation. The results are kept in a bounded
+        in-memory LRU and, optionally, in a directory on disk evicted by size, oldest access first.
+    :param max_entries: the maximal number of results in memory
+    :param max_bytes: the maximal total size of the results in memory. If None, only max_entries is checked
+    :param directory: the directory of the on-disk tier. If None, the results are only kept in memory
+    :param max_disk_bytes: the maximal total size of the files in directory
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: Optional[int] = None, directory: Optional[str] = None,
+                 max_disk_bytes: int = 2 ** 30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, func: Callable, *args, **kwargs) -> str:
+        """
+        This function is to make the cache key of a call
+        :param func: the function
+        :param args: the positional arguments of the call
+        :param kwargs: the keyword arguments of the call
+        :return: the fingerprint of the function, the index and the columns of the input data named in the
+            arguments, and the other arguments
+        """
+        signature = inspect.signature(func)
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        # only the columns named in the arguments are read, unless cols=None selects all of them or the
+        # arguments are passed on to another function
+        names: set = set()
+        _names([v for v in arguments.arguments.values() if not isinstance(v, pd.DataFrame)], names)
+        all_columns = arguments.arguments.get('cols', '') is None or any(
+            p.kind is inspect.Parameter.VAR_KEYWORD for p in signature.parameters.values())
+
+        items = {}
+        for name, value in arguments.arguments.items():
+            if isinstance(value, Grouping):
+                # a Grouping only saves work, it does not change the result
+                value = None
+            elif isinstance(value, pd.DataFrame) and not all_columns:
+                h = hashlib.blake2b(digest_size=20)
+                _update_frame(h, value, [c for c in value.columns if c in names])
+                value = ('frame', h.hexdigest())
+            items[name] = value
+        return fingerprint(['{}.{}'.format(func.__module__, func.__qualname__), items])
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        This function is to return the cached result of a call, calculating and caching it on a miss
+        :param func: the function
+        :param args: the positional arguments of the call
+        :param kwargs: the keyword arguments of the call
+        :return: the result of func(*args, **kwargs)
+        """
+        key = self.key(func, *args, **kwargs)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return _copy(self._entries[key][0])
+
+        result = self._load(key)
+        if result is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            result = func(*args, **kwargs)
+            self._dump(key, result)
+        self._store(key, result)
+        return _copy(result)
+
+    def __call__(self, func: Callable) -> Callable:
+        """
+        Decorator caching the calls of func, e.g. cached_lag = cache(group_lag)
+        """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+
+        return wrapper
+
+    def _store(self, key: str, result: Any) -> None:
+        size = _nbytes(result)
+        self._entries[key] = (result, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.pkl')
+
+    def _load(self, key: str) -> Any:
+        if self.directory is None or not os.path.exists(self._path(key)):
+            return None
+        path = self._path(key)
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+        # the access time orders the eviction
+        os.utime(path)
+        return result
+
+    def _dump(self, key: str, result: Any) -> None:
+        if self.directory is None:
+            return
+        tmp = self._path(key) + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.pkl')]
+        stats = sorted((os.stat(path).st_mtime, os.stat(path).st_size, path) for path in files)
+        total = sum(size for _, size, _ in stats)
+        for _, size, path in stats:
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def stats(self) -> dict:
+        """
+        This function is to return the hit and miss statistics
+        :return: the numbers of memory hits, disk hits and misses, the hit rate and the number and total size of
+            the results in memory
+        """
+        calls = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / calls if calls else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+        }
+
+    def clear(self) -> None:
+        """
+        This function is to remove all the results from memory and disk and reset the statistics
+        """
+        self._entries.clear()
+        self._bytes = 0
+        self.memory_hits = self.disk_hits = self.misses = 0
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.directory, name))
@@ -1,11 +1,92 @@
 from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 
+from .encoder import CategoryEncoder
+from .grouping import Grouping
+from .instrument import instrumented
 from .sum import group_sum_index
 
 
-def last_k_count(df_data: pd.DataFrame, cols: List[str], k: int, historical: bool = True) -> pd.DataFrame:
+def _check_category_number(df_data: pd.DataFrame, cols: List[str],
+                           encoder: Optional[CategoryEncoder] = None) -> None:
+    if encoder is not None:
+        max_cat_num = encoder.n_categories(cols)
+    else:
+        max_cat_num = max(df_data[cols].nunique().to_list())
+    if max_cat_num > 20:
+        raise Exception("category number should not be more than 20, use sparse=True for more categories")
+
+
+def _own_category_count(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
+                        k: Optional[int] = None, encoded: bool = False) -> pd.DataFrame:
+    """
+    Count, for each record, the records of its own category among the previous (last k) records of its group.
+    """
+    if encoded:
+        # the code -1 of missing values and unknown categories is not a category
+        df_data = df_data.assign(**{c: df_data[c].where(df_data[c] >= 0) for c in cols})
+    n = df_data.shape[0]
+    grouping = Grouping(df_data, group_by)
+    position = grouping.scatter(grouping.positions)
+    result = {}
+    for c in cols:
+        own = Grouping(df_data, group_by + [c])
+        seen = own.positions
+        if k is not None:
+            # remove the records of the same group and category which are more than k records back
+            own_position = own.sort(position).astype(np.int64)
+            key = own.codes[own.order[:own.n_valid]] * (n + 1)
+            old = np.searchsorted(key + own_position, key + own_position - k, side='left') - own.starts
+            seen = seen - old
+        result[c] = np.where(position >= (1 if k is None else k), own.scatter(seen), np.nan)
+    return pd.DataFrame(result, index=df_data.index)
+
+
+def _check_encoded(encoder: Optional[CategoryEncoder], encoded: bool) -> None:
+    if encoded and encoder is None:
+        raise Exception("the encoder of the codes should be given with encoded=True")
+
+
+def _decoded(df_data: pd.DataFrame, cols: List[str], encoder: Optional[CategoryEncoder] = None,
+             encoded: bool = False) -> pd.DataFrame:
+    """
+    Replace the codes of cols by their categories, dropping the records of code -1 as groupby drops missing values.
+    """
+    if not encoded:
+        return df_data
+    df_data = df_data[(df_data[cols] >= 0).all(axis=1)]
+    return df_data.assign(**{c: encoder.categories[c].take(df_data[c].to_numpy()).to_numpy() for c in cols})
+
+
+def _category_count(df_data: pd.DataFrame, cols: List[str], encoder: Optional[CategoryEncoder] = None,
+                    encoded: bool = False) -> pd.DataFrame:
+    """
+    Count the records of each category, indexed by the column and the category. With an encoder, every learned
+        category is counted, so the index does not depend on the data.
+    """
+    if encoder is not None:
+        df_codes = df_data[cols] if encoded else encoder.codes(df_data, cols)
+        df_result = pd.concat({c: pd.Series(np.bincount(df_codes[c][df_codes[c] >= 0],
+                                                        minlength=len(encoder.categories[c])),
+                                            index=encoder.categories[c]) for c in cols})
+    else:
+        df_result = pd.concat({c: df_data[c].value_counts(sort=False).sort_index() for c in cols})
+    return df_result.astype(float).to_frame('count')
+
+
+def _dummies(df_data: pd.DataFrame, cols: List[str], encoder: Optional[CategoryEncoder] = None,
+             encoded: bool = False) -> pd.DataFrame:
+    if encoder is not None:
+        return encoder.one_hot(df_data, cols, encoded)
+    return pd.get_dummies(df_data[cols].astype("category"))
+
+
+@instrumented
+def last_k_count(df_data: pd.DataFrame, cols: List[str], k: int, historical: bool = True,
+                 sparse: bool = False, encoder: Optional[CategoryEncoder] = None,
+                 encoded: bool = False) -> pd.DataFrame:
     """
     This function is to calculate the count of data
     :param df_data: input data
@@ -13,20 +94,32 @@ def last_k_count(df_data: pd.DataFrame, cols: List[str], k: int, historical: boo
     :param k: the number of last k records
     :param historical: If True, return the count for unique values within the last k records for each actual record.
         If False, only return the count for unique values of the last k records of the data
+    :param sparse: If True, do not expand the categories into columns: return for each actual record only the count
+        of its own category, or if historical is False the count indexed by column and category
+    :param encoder: the categories of cols learned beforehand. If given, the data is not scanned for its
+        categories and the output has one column per learned category, the same for every batch of data
+    :param encoded: If True, cols hold the integer codes of encoder.codes, which are used as they are instead of
+        encoding the categories again
     :return: the result of the count calculation
     """
-    max_cat_num = max(df_data[cols].nunique().to_list())
-    if max_cat_num > 20:
-        raise Exception("category number should not be more than 20")
-
+    _check_encoded(encoder, encoded)
+    if sparse:
+        if historical:
+            return _own_category_count(df_data, cols, [], k, encoded)
+        df_result = _category_count(df_data[cols].tail(k), cols, encoder, encoded)
+        return df_result if df_data.shape[0] >= k else df_result * np.nan
+
+    _check_category_number(df_data, cols, encoder)
     if historical:
-        return pd.get_dummies(df_data[cols].astype("category")).shift(1).rolling(k).sum()
+        return _dummies(df_data, cols, encoder, encoded).shift(1).rolling(k).sum()
     else:
-        return pd.get_dummies(df_data[cols].tail(k).astype("category")).sum(min_count=k).to_frame().transpose()
+        return _dummies(df_data.tail(k), cols, encoder, encoded).sum(min_count=k).to_frame().transpose()
 
 
+@instrumented
 def group_last_k_count(df_data: pd.DataFrame, cols: List[str], k: int, group_by: List[str],
-                     historical: bool = True) -> pd.DataFrame:
+                     historical: bool = True, sparse: bool = False,
+                     encoder: Optional[CategoryEncoder] = None, encoded: bool = False) -> pd.DataFrame:
     """
     This function is to calculate the count of data within groups
     :param df_data: input data
@@ -36,46 +129,66 @@ def group_last_k_count(df_data: pd.DataFrame, cols: List[str], k: int, group_by:
     :param historical: If True, return the count for unique values within the last k records for each actual
         record within each group. If False, only return the count for unique values of the last k records of
         the data within each group
+    :param sparse: If True and historical, do not expand the categories into columns: return for each actual record
+        only the count of its own category within the last k records of its group
+    :param encoder: the categories of cols learned beforehand. If given, the data is not scanned for its
+        categories and the output has one column per learned category, the same for every batch of data
+    :param encoded: If True, cols hold the integer codes of encoder.codes, which are used as they are instead of
+        encoding the categories again
     :return: the result of the count calculation within groups
     """
-    max_cat_num = max(df_data[cols].nunique().to_list())
-    if max_cat_num > 20:
-        raise Exception("category number should not be more than 20")
-
+    _check_encoded(encoder, encoded)
     if historical:
+        if sparse:
+            return _own_category_count(df_data, cols, group_by, k, encoded)
+        _check_category_number(df_data, cols, encoder)
         gb_cols = group_by + cols
         df = df_data.groupby(gb_cols).size().to_frame('count').drop('count', 1).reset_index(level=gb_cols)
-        df_join = df[group_by].join(pd.get_dummies(df[cols].astype("category")))
+        df_join = df[group_by].join(_dummies(df, cols, encoder, encoded))
         df_join.index.name = 'num'
         df_result = df_join.set_index(group_by, append=True).groupby(level=group_by).shift(1).\
             groupby(level=group_by).rolling(k).sum().reset_index(group_by)
         return df_result
     else:
         gb_cols = group_by + cols
-        return df_data.groupby(group_by).tail(k).groupby(gb_cols).size().to_frame('count').reset_index(level=gb_cols)
+        df_tail = _decoded(df_data.groupby(group_by).tail(k), cols, encoder, encoded)
+        return df_tail.groupby(gb_cols).size().to_frame('count').reset_index(level=gb_cols)
 
 
-def count(df_data: pd.DataFrame, cols: List[str], historical: bool = True) -> pd.DataFrame:
+@instrumented
+def count(df_data: pd.DataFrame, cols: List[str], historical: bool = True, sparse: bool = False,
+          encoder: Optional[CategoryEncoder] = None, encoded: bool = False) -> pd.DataFrame:
     """
     This function is to calculate the count of data
     :param df_data: input data
     :param cols: the columns for the count calculation
     :param historical: If True, return the count for unique values of previous records for each actual record.
         If False, only return the count for unique values of all the data
+    :param sparse: If True, do not expand the categories into columns: return for each actual record only the count
+        of its own category, or if historical is False the count indexed by column and category
+    :param encoder: the categories of cols learned beforehand. If given, the data is not scanned for its
+        categories and the output has one column per learned category, the same for every batch of data
+    :param encoded: If True, cols hold the integer codes of encoder.codes, which are used as they are instead of
+        encoding the categories again
     :return: the result of the count calculation
     """
-    max_cat_num = max(df_data[cols].nunique().to_list())
-    if max_cat_num > 20:
-        raise Exception("category number should not be more than 20")
+    _check_encoded(encoder, encoded)
+    if sparse:
+        if historical:
+            return _own_category_count(df_data, cols, [], encoded=encoded)
+        return _category_count(df_data, cols, encoder, encoded)
 
+    _check_category_number(df_data, cols, encoder)
     if historical:
-        return pd.get_dummies(df_data[cols].astype("category")).expanding().sum().shift(1)
+        return _dummies(df_data, cols, encoder, encoded).expanding().sum().shift(1)
     else:
-        return pd.get_dummies(df_data[cols].astype("category")).sum().to_frame().transpose()
+        return _dummies(df_data, cols, encoder, encoded).sum().to_frame().transpose()
 
 
+@instrumented
 def group_count(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
-              historical: bool = True) -> pd.DataFrame:
+              historical: bool = True, sparse: bool = False,
+              encoder: Optional[CategoryEncoder] = None, encoded: bool = False) -> pd.DataFrame:
     """
     This function is to calculate the count of data within groups
     :param df_data: input data
@@ -83,25 +196,33 @@ def group_count(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
     :param group_by: the columns for dividing the data into groups
     :param historical: If True, return the count for unique values of previous records for each actual record
         within groups. If False, only return the count for unique values of all the data within groups.
+    :param sparse: If True and historical, do not expand the categories into columns: return for each actual record
+        only the count of its own category within the previous records of its group
+    :param encoder: the categories of cols learned beforehand. If given, the data is not scanned for its
+        categories and the output has one column per learned category, the same for every batch of data
+    :param encoded: If True, cols hold the integer codes of encoder.codes, which are used as they are instead of
+        encoding the categories again
     :return: the result of the count calculation within groups
     """
-    max_cat_num = max(df_data[cols].nunique().to_list())
-    if max_cat_num > 20:
-        raise Exception("category number should not be more than 20")
-
+    _check_encoded(encoder, encoded)
     if historical:
+        if sparse:
+            return _own_category_count(df_data, cols, group_by, encoded=encoded)
+        _check_category_number(df_data, cols, encoder)
         gb_cols = group_by + cols
         df = df_data.groupby(gb_cols).size().to_frame('count').drop('count', 1).reset_index(level=gb_cols)
-        df_join = df[group_by].join(pd.get_dummies(df[cols].astype("category")))
+        df_join = df[group_by].join(_dummies(df, cols, encoder, encoded))
         df_join.index.name = 'num'
         df_result = df_join.set_index(group_by, append=True).groupby(level=group_by).shift(1).\
             groupby(level=group_by).expanding().sum().reset_index(group_by)
         return df_result
     else:
         gb_cols = group_by + cols
-        return df_data.groupby(gb_cols).size().to_frame('count').reset_index(level=gb_cols)
+        return _decoded(df_data, cols, encoder, encoded).groupby(gb_cols).size().to_frame('count').\
+            reset_index(level=gb_cols)
 
 
+@instrumented
 def group_category_count_index(df_data: pd.DataFrame, category_index: str, group_by: List[str],
               index: str, interval: float, category_columns: Optional[List[str]]=None) -> pd.DataFrame:
     """
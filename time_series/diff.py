@@ -1,80 +1,112 @@
-from typing import List
+from typing import List, Optional
+import numpy as np
 import pandas as pd
 
 from .sum import last_k_sum, group_last_k_sum
 from .avg import last_k_avg, group_last_k_avg
+from .grouping import Grouping
+from .instrument import instrumented
 
 
-def last_k_diff_sum(df_data: pd.DataFrame, a_cols: List[str], b_cols: List[str], k: int, historical: bool = True) \
-        -> pd.DataFrame:
+def _subtract(df_result: pd.DataFrame, a_cols: List[str], dtype) -> pd.DataFrame:
+    # df_result has the a_cols block followed by the b_cols block, they are subtracted by position
+    values = df_result.to_numpy(dtype=float)
+    n_a = len(a_cols)
+    np.subtract(values[:, :n_a], values[:, n_a:], out=values[:, :n_a])
+    return pd.DataFrame(values[:, :n_a].astype(dtype, copy=False), columns=a_cols, index=df_result.index)
+
+
+def _check_cols(a_cols: List[str], b_cols: List[str]) -> None:
+    if len(a_cols) != len(b_cols):
+        raise Exception("a_cols and b_cols should have the same number of columns, got {} and {}"
+                        .format(len(a_cols), len(b_cols)))
+
+
+@instrumented
+def last_k_diff_sum(df_data: pd.DataFrame, a_cols: List[str], b_cols: List[str], k: int, historical: bool = True,
+                    dtype=np.float64) -> pd.DataFrame:
     """
     This function is to calculate the difference of the sum of the last k records within column a and within column b
     :param df_data: input data
     :param a_cols: the columns for the sum calculation
-    :param b_cols: the columns for the sum calculation
+    :param b_cols: the columns for the sum calculation, paired with a_cols by position
     :param k: the number of last k records
     :param historical: If True, return the difference of the sum of the last k records for the actual records
         in column a and column b. If False, only return the difference of the sum of the last k records of all
         the records in column a and column b
-    :return: the result of difference
+    :param dtype: the dtype of the result, e.g. np.float32 to halve its size
+    :return: the result of difference, named by a_cols
     """
-    return last_k_sum(df_data=df_data, cols=a_cols, k=k, historical=historical) -\
-        last_k_sum(df_data=df_data, cols=b_cols, k=k, historical=historical)
+    _check_cols(a_cols, b_cols)
+    df_result = last_k_sum(df_data=df_data, cols=list(a_cols) + list(b_cols), k=k, historical=historical)
+    return _subtract(df_result, a_cols, dtype)
 
 
+@instrumented
 def group_last_k_diff_sum(df_data: pd.DataFrame, a_cols: List[str], b_cols: List[str], k: int, group_by: List[str],
-                          historical: bool = True) -> pd.DataFrame:
+                          historical: bool = True, grouping: Optional[Grouping] = None,
+                          dtype=np.float64) -> pd.DataFrame:
     """
     This function is to calculate the difference of the group sum of the last k records within column a and within
         column b
     :param df_data: input data
     :param a_cols: the columns for the sum calculation
-    :param b_cols: the columns for the sum calculation
+    :param b_cols: the columns for the sum calculation, paired with a_cols by position
     :param k: the number of last k records
     :param group_by: the columns for dividing the data into groups
     :param historical: If True, return the difference of the group sum of the last k records for the actual records
         in column a and column b. If False, only return the difference of the group sum of the last k records of all
         the records in column a and column b
-    :return: the result of difference
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
+    :param dtype: the dtype of the result, e.g. np.float32 to halve its size
+    :return: the result of difference, named by a_cols
     """
-    return group_last_k_sum(df_data=df_data, cols=a_cols, k=k, group_by=group_by,
-                            historical=historical) - group_last_k_sum(df_data=df_data, cols=b_cols, k=k,
-                                                                      group_by=group_by, historical=historical)
+    _check_cols(a_cols, b_cols)
+    df_result = group_last_k_sum(df_data=df_data, cols=list(a_cols) + list(b_cols), k=k, group_by=group_by,
+                                 historical=historical, grouping=grouping)
+    return _subtract(df_result, a_cols, dtype)
 
 
+@instrumented
 def last_k_diff_avg(df_data: pd.DataFrame, a_cols: List[str], b_cols: List[str], k: int,
-                    historical: bool = True) -> pd.DataFrame:
+                    historical: bool = True, dtype=np.float64) -> pd.DataFrame:
     """
     This function is to calculate the difference of the average the last k records within column a and within column b
     :param df_data: input data
     :param a_cols: the columns for the average calculation
-    :param b_cols: the columns for the average calculation
+    :param b_cols: the columns for the average calculation, paired with a_cols by position
     :param k: the number of last k records
     :param historical: If True, return the difference of the average of the last k records for the actual records
         in column a and column b. If False, only return the difference of the average of the last k records of all
         the records in column a and column b
-    :return: the result of difference
+    :param dtype: the dtype of the result, e.g. np.float32 to halve its size
+    :return: the result of difference, named by a_cols
     """
-    return last_k_avg(df_data=df_data, cols=a_cols, k=k, historical=historical) - last_k_avg(df_data=df_data,
-                                                                                             cols=b_cols, k=k,
-                                                                                             historical=historical)
+    _check_cols(a_cols, b_cols)
+    df_result = last_k_avg(df_data=df_data, cols=list(a_cols) + list(b_cols), k=k, historical=historical)
+    return _subtract(df_result, a_cols, dtype)
 
 
+@instrumented
 def group_last_k_diff_avg(df_data: pd.DataFrame, a_cols: List[str], b_cols: List[str], k: int, group_by: List[str],
-                          historical: bool = True) -> pd.DataFrame:
+                          historical: bool = True, grouping: Optional[Grouping] = None,
+                          dtype=np.float64) -> pd.DataFrame:
     """
     This function is to calculate the difference of the group average of the last k records within column a and
         within column b
     :param df_data: input data
     :param a_cols: the columns for the average calculation
-    :param b_cols: the columns for the average calculation
+    :param b_cols: the columns for the average calculation, paired with a_cols by position
     :param k: the number of last k records
     :param group_by: the columns for dividing the data into groups
     :param historical: If True, return the difference of the group average of the last k records for the actual
         records in column a and column b. If False, only return the difference of the group average of the last
         k records of all the records in column a and column b
-    :return: the result of difference
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
+    :param dtype: the dtype of the result, e.g. np.float32 to halve its size
+    :return: the result of difference, named by a_cols
     """
-    return group_last_k_avg(df_data=df_data, cols=a_cols, k=k, group_by=group_by,
-                            historical=historical) - group_last_k_avg(df_data=df_data, cols=b_cols, k=k,
-                                                                      group_by=group_by, historical=historical)
+    _check_cols(a_cols, b_cols)
+    df_result = group_last_k_avg(df_data=df_data, cols=list(a_cols) + list(b_cols), k=k, group_by=group_by,
+                                 historical=historical, grouping=grouping)
+    return _subtract(df_result, a_cols, dtype)
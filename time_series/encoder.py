@@ -0,0 +1,110 @@
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class CategoryEncoder:
+    """
+    The category dictionaries of columns, learned once and reused by the count functions, so that they neither scan
+        the data for its categories again nor change their output columns between training and serving data.
+    :param categories: the categories of every column, e.g. from a saved encoder. If None, call fit
+    """
+
+    def __init__(self, categories: Optional[Dict[str, list]] = None):
+        self.categories: Dict[str, pd.Index] = {c: pd.Index(v) for c, v in (categories or {}).items()}
+
+    def fit(self, df_data: pd.DataFrame, cols: List[str]) -> "CategoryEncoder":
+        """
+        This function is to learn the categories of columns, in the sorted order of astype('category')
+        :param df_data: input data
+        :param cols: the columns to learn
+        :return: the encoder itself
+        """
+        for c in cols:
+            self.categories[c] = pd.Categorical(df_data[c]).categories
+        return self
+
+    def n_categories(self, cols: List[str]) -> int:
+        """
+        This function is to return the largest number of categories of the columns
+        :param cols: the columns
+        :return: the largest number of categories
+        """
+        return max(len(self._categories(c)) for c in cols)
+
+    def _categories(self, col: str) -> pd.Index:
+        if col not in self.categories:
+            raise Exception("column {} is not fitted by the encoder".format(col))
+        return self.categories[col]
+
+    def codes(self, df_data: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+        """
+        This function is to encode columns into integer codes
+        :param df_data: input data
+        :param cols: the columns to encode
+        :return: the codes of the categories, -1 for missing values and unknown categories
+        """
+        return pd.DataFrame({c: pd.Categorical(df_data[c], categories=self._categories(c)).codes for c in cols},
+                            index=df_data.index)
+
+    def transform(self, df_data: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+        """
+        This function is to encode columns into categorical columns with the learned categories
+        :param df_data: input data
+        :param cols: the columns to encode
+        :return: the categorical columns, NaN for unknown categories
+        """
+        return pd.DataFrame({c: pd.Categorical(df_data[c], categories=self._categories(c)) for c in cols},
+                            index=df_data.index)
+
+    def one_hot(self, df_data: pd.DataFrame, cols: List[str], encoded: bool = False) -> pd.DataFrame:
+        """
+        This function is to one-hot encode columns, with one column per learned category
+        :param df_data: input data
+        :param cols: the columns to encode
+        :param encoded: If True, cols hold the integer codes of codes(), which are used as they are
+        :return: the dummy columns, named as by pd.get_dummies
+        """
+        if not encoded:
+            return pd.get_dummies(self.transform(df_data, cols))
+        blocks = []
+        columns = []
+        for c in cols:
+            categories = self._categories(c)
+            codes = df_data[c].to_numpy()
+            if codes.shape[0] and codes.max() >= len(categories):
+                raise Exception("the codes of column {} are not codes of the encoder".format(c))
+            # one contiguous row per category, the code -1 of missing values and unknown categories takes the
+            # last column, of zeros
+            eye = np.eye(len(categories), len(categories) + 1, dtype=np.uint8)
+            blocks.append(eye[:, codes])
+            columns += ['{}_{}'.format(c, v) for v in categories]
+        values = np.vstack(blocks) if blocks else np.empty((0, df_data.shape[0]), dtype=np.uint8)
+        return pd.DataFrame(dict(zip(columns, values)), columns=columns, index=df_data.index)
+
+    def to_dict(self) -> Dict[str, list]:
+        """
+        This function is to return the categories of every column as plain lists
+        :return: the categories by column
+        """
+        return {c: np.asarray(v, dtype=object).tolist() for c, v in self.categories.items()}
+
+    def save(self, path: str) -> None:
+        """
+        This function is to save the categories as json
+        :param path: the file path
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> "CategoryEncoder":
+        """
+        This function is to load an encoder saved by save
+        :param path: the file path
+        :return: the encoder
+        """
+        with open(path) as f:
+            return cls(json.load(f))
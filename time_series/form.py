@@ -1,47 +1,76 @@
+from typing import Sequence, Union
+
+import numpy as np
 import pandas as pd
 
+from ._kernels import jit
+from .instrument import instrumented
+
+
+@jit
+def _form_kernel(a_codes: np.ndarray, b_codes: np.ndarray, states: np.ndarray, gammas: np.ndarray,
+                 n_ids: int):
+    n = a_codes.shape[0]
+    n_gamma = gammas.shape[0]
+    s = np.ones((n_ids, n_gamma))
+    results = np.empty((n, 2, n_gamma))
+    for i in range(n):
+        a_id = a_codes[i]
+        b_id = b_codes[i]
+        state = states[i]
+        for j in range(n_gamma):
+            gamma = gammas[j]
+            s_a = s[a_id, j]
+            s_b = s[b_id, j]
+            results[i, 0, j] = s_a
+            results[i, 1, j] = s_b
+            if state == 2:
+                s[a_id, j] = s_a + gamma * s_b
+                s[b_id, j] = s_b - gamma * s_b
+            elif state == 0:
+                s[b_id, j] = s_b + gamma * s_b
+                s[a_id, j] = s_a - gamma * s_a
+            else:
+                s[a_id, j] = s_a - gamma * (s_a - s_b)
+                s[b_id, j] = s_b - gamma * (s_b - s_a)
+    return results, s
 
-def form(df_data: pd.DataFrame, a_id_col: str, b_id_col: str, gamma: float, state_col: str, historical: bool = True) \
-        -> pd.DataFrame:
+
+@instrumented
+def form(df_data: pd.DataFrame, a_id_col: str, b_id_col: str, gamma: Union[float, Sequence[float]], state_col: str,
+         historical: bool = True) -> pd.DataFrame:
     """
     The method is from paper <<Predictive analysis and modelling football results using machine learning
         approach for English Premier League>> which evaluates a team's performances in individual matches
     :param df_data: input data
     :param a_id_col: the name of the column containing ids team a
     :param b_id_col: the name of the column containing ids team b
-    :param gamma: the stealing fraction, 0 < gamma < 1
+    :param gamma: the stealing fraction, 0 < gamma < 1. If a list of values is given, all of them are evaluated in
+        the same pass and the columns of the result are indexed by gamma first
     :param state_col: 0 means that A losses, 1 means a draw, and 2 means that A wins
     :param historical: if True, return the actual form scores for both teams which plays in the same game.
         If False, only return the final form score for each team.
     :return: the result of the form score
     """
-    a_ids = df_data[a_id_col]
-    b_ids = df_data[b_id_col]
-    ids = set(a_ids) | set(b_ids)
-
-    # init
-    s = {_id: 1.0 for _id in ids}
-
-    # update
-    results = []
-    for i, row in df_data[[a_id_col, b_id_col, state_col]].iterrows():
-        a_id = row[a_id_col]
-        b_id = row[b_id_col]
-        state = row[state_col]
-
-        results.append([s[a_id], s[b_id]])
-        if state == 2:
-            s[a_id], s[b_id] = s[a_id] + gamma * s[b_id], s[b_id] - gamma * s[b_id]
-        elif state == 0:
-            s[b_id], s[a_id] = s[b_id] + gamma * s[b_id], s[a_id] - gamma * s[a_id]
-        elif state == 1:
-            s[a_id], s[b_id] = \
-                s[a_id] - gamma * (s[a_id] - s[b_id]), \
-                s[b_id] - gamma * (s[b_id] - s[a_id])
-        else:
-            raise Exception("state value must be 0, 1, or 2")
+    states = df_data[state_col].to_numpy()
+    if not np.isin(states, [0, 1, 2]).all():
+        raise Exception("state value must be 0, 1, or 2")
+
+    # factorize the ids of both teams together, so that a team has the same code on both sides
+    n = df_data.shape[0]
+    codes, ids = pd.factorize(pd.concat([df_data[a_id_col], df_data[b_id_col]], ignore_index=True))
+
+    sweep = np.ndim(gamma) > 0
+    gammas = np.atleast_1d(np.asarray(gamma, dtype=float))
+    results, s = _form_kernel(codes[:n], codes[n:], states.astype(np.int64), gammas, len(ids))
 
     if historical:
-        return pd.DataFrame(results, columns=['a_score', 'b_score'], index=df_data.index)
+        if sweep:
+            columns = pd.MultiIndex.from_product([gammas, ['a_score', 'b_score']], names=['gamma', None])
+            return pd.DataFrame(results.transpose(0, 2, 1).reshape(n, -1), columns=columns, index=df_data.index)
+        return pd.DataFrame(results[:, :, 0], columns=['a_score', 'b_score'], index=df_data.index)
     else:
-        return pd.DataFrame(s, index=['score']).transpose()
+        if sweep:
+            columns = pd.MultiIndex.from_product([gammas, ['score']], names=['gamma', None])
+            return pd.DataFrame(s, columns=columns, index=ids)
+        return pd.DataFrame(s[:, :1], columns=['score'], index=ids)
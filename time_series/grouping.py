@@ -0,0 +1,91 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ._kernels import shift
+
+
+class Grouping:
+    """
+    The group-sorted layout of data: the records sorted by group, keeping the record order within each group.
+        It stores the sort permutation and its inverse, so that results computed group by group are put back into
+        the record order by position, and it can be passed to the group_* functions to be reused between calls.
+    :param df_data: input data
+    :param group_by: the columns for dividing the data into groups. If None, the whole data is one group
+    """
+
+    def __init__(self, df_data: pd.DataFrame, group_by: Optional[List[str]] = None):
+        self.group_by = list(group_by) if group_by else []
+        self.index = df_data.index
+        if self.group_by:
+            grouped = df_data.groupby(self.group_by)
+            codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+            self.keys: Optional[pd.Index] = grouped.size().index
+            n_groups = len(self.keys)
+        else:
+            codes = np.zeros(df_data.shape[0], dtype=np.int64)
+            self.keys = None
+            n_groups = 1 if df_data.shape[0] else 0
+
+        # records with a missing group key are moved behind all the groups
+        self.codes = np.where(codes < 0, n_groups, codes)
+        self.order = np.argsort(self.codes, kind="stable")
+        self.inverse = np.empty_like(self.order)
+        self.inverse[self.order] = np.arange(self.order.shape[0])
+
+        counts = np.bincount(self.codes, minlength=n_groups + 1)[:n_groups]
+        self.sizes = counts
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.n_valid = int(self.offsets[-1])
+        # the group start and the position within the group of every sorted record
+        self.starts = np.repeat(self.offsets[:-1], counts)
+        self.positions = np.arange(self.n_valid) - self.starts
+
+    @property
+    def n_groups(self) -> int:
+        return self.sizes.shape[0]
+
+    def sort(self, values: np.ndarray) -> np.ndarray:
+        """
+        This function is to sort the values of the records into the group-sorted layout
+        :param values: values in the record order, the first axis is the records
+        :return: values of the records with a group key, in the group-sorted order
+        """
+        return np.take(values, self.order[:self.n_valid], axis=0)
+
+    def scatter(self, values: np.ndarray) -> np.ndarray:
+        """
+        This function is to put values in the group-sorted layout back into the record order
+        :param values: values of the records with a group key, in the group-sorted order
+        :return: values in the record order, NaN for the records with a missing group key
+        """
+        values = np.asarray(values, dtype=float)
+        if self.n_valid < self.order.shape[0]:
+            pad = np.full((self.order.shape[0] - self.n_valid,) + values.shape[1:], np.nan)
+            values = np.concatenate([values, pad])
+        return np.take(values, self.inverse, axis=0)
+
+    def lag(self, values: np.ndarray, k: int = 1) -> np.ndarray:
+        """
+        This function is to shift group-sorted values by k records within each group and put them back into the
+            record order
+        :param values: values of the records with a group key, in the group-sorted order
+        :param k: the number of records to shift
+        :return: the shifted values in the record order
+        """
+        return self.scatter(shift(values, self.positions, k))
+
+    def lag_positions(self, k: int) -> np.ndarray:
+        """
+        This function is to find the record k records before each record within its group
+        :param k: the number of records to shift
+        :return: the positions of the shifted records in the record order, -1 if there is none
+        """
+        sorted_rows = self.order[:self.n_valid]
+        source = np.full(sorted_rows.shape[0], -1, dtype=np.int64)
+        has_source = self.positions >= k
+        source[has_source] = sorted_rows[np.flatnonzero(has_source) - k]
+        result = np.full(self.order.shape[0], -1, dtype=np.int64)
+        result[sorted_rows] = source
+        return result
@@ -0,0 +1,157 @@
+import functools
+import inspect
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from .grouping import Grouping
+
+# the hooks called with the record of every instrumented call, no record is made while it is empty
+_hooks: List[Callable[[dict], None]] = []
+# the running peak traced memory of the calls in progress, outermost first
+_peaks: List[int] = []
+# the seconds spent on the records of the nested calls, left out of the wall time of the calls in progress
+_overheads: List[float] = []
+_depth = 0
+
+
+def register_hook(hook: Callable[[dict], None]) -> None:
+    """
+    This function is to register a hook called with the record of every instrumented call
+    :param hook: the hook, a record has the function name, the wall time in seconds, the input rows, the number of
+        groups, the output shape, the peak allocated bytes (None if memory is not traced) and the call depth
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[dict], None]) -> None:
+    """
+    This function is to remove a registered hook
+    :param hook: the hook
+    """
+    _hooks.remove(hook)
+
+
+def _n_groups(arguments: Dict) -> Optional[int]:
+    df_data = arguments.get('df_data')
+    keys = arguments.get('group_by') or arguments.get('team_id')
+    if not isinstance(df_data, pd.DataFrame) or not keys:
+        return None
+    grouping = arguments.get('grouping')
+    if isinstance(grouping, Grouping):
+        return grouping.n_groups
+    return df_data.groupby(keys).ngroups
+
+
+def _call(func: Callable, signature: inspect.Signature, args: tuple, kwargs: dict):
+    global _depth
+    arguments = signature.bind_partial(*args, **kwargs).arguments
+    df_data = arguments.get('df_data')
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if _peaks:
+            _peaks[-1] = max(_peaks[-1], peak)
+        tracemalloc.reset_peak()
+        _peaks.append(current)
+
+    _depth += 1
+    _overheads.append(0.0)
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        end = time.perf_counter()
+        overhead = _overheads.pop()
+        seconds = end - start - overhead
+        _depth -= 1
+        peak_bytes = None
+        if tracing:
+            before = current
+            peak = max(_peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if _peaks:
+                _peaks[-1] = max(_peaks[-1], peak)
+            peak_bytes = peak - before
+
+    record = {
+        'function': '{}.{}'.format(func.__module__, func.__qualname__),
+        'seconds': seconds,
+        'rows': df_data.shape[0] if isinstance(df_data, pd.DataFrame) else None,
+        'groups': _n_groups(arguments),
+        'output_shape': getattr(result, 'shape', None),
+        'peak_bytes': peak_bytes,
+        'depth': _depth,
+    }
+    for hook in list(_hooks):
+        hook(record)
+
+    # counting the groups and calling the hooks is not part of the calls in progress
+    if tracing:
+        tracemalloc.reset_peak()
+    if _overheads:
+        _overheads[-1] += overhead + time.perf_counter() - end
+    return result
+
+
+def instrumented(func: Callable) -> Callable:
+    """
+    Decorator of the public functions, which only costs a check of the hook list while no hook is registered.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _hooks:
+            return func(*args, **kwargs)
+        return _call(func, signature, args, kwargs)
+
+    return wrapper
+
+
+class Recorder:
+    """
+    Context manager recording every instrumented call made inside it.
+    :param memory: If True, trace the peak allocated bytes of every call with tracemalloc, which slows the calls down
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.records: List[dict] = []
+        self._started_tracing = False
+
+    def __enter__(self) -> "Recorder":
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        register_hook(self.records.append)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        remove_hook(self.records.append)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        This function is to return the records of all the calls
+        :return: one row per call, in the order the calls finished
+        """
+        columns = ['function', 'seconds', 'rows', 'groups', 'output_shape', 'peak_bytes', 'depth']
+        return pd.DataFrame(self.records, columns=columns)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        This function is to summarize the records by function
+        :return: the number of calls, the total and max wall time, the total input rows and the max peak allocated
+            bytes of every function, the slowest first
+        """
+        return self.to_frame().groupby('function').agg(
+            calls=('seconds', 'size'),
+            total_seconds=('seconds', 'sum'),
+            max_seconds=('seconds', 'max'),
+            rows=('rows', 'sum'),
+            max_peak_bytes=('peak_bytes', 'max'),
+        ).sort_values('total_seconds', ascending=False)
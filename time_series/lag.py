@@ -1,8 +1,13 @@
-from typing import List, Optional, Union
+from typing import List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
+from .grouping import Grouping
+from .instrument import instrumented
 
+
+@instrumented
 def lag(df_data: pd.DataFrame, cols: List[str], k: int, historical: bool = True) -> pd.DataFrame:
     """
     This function is to calculate the average of data
@@ -19,25 +24,86 @@ def lag(df_data: pd.DataFrame, cols: List[str], k: int, historical: bool = True)
         return df.tail(1).reset_index(drop=True)
 
 
+@instrumented
 def group_lag(df_data: pd.DataFrame, k: int, group_by: List[str], cols: Optional[List[str]] = None,
-              historical: bool = True, resort_index: Optional[Union[pd.Series, pd.Index]] = None) -> pd.DataFrame:
+              historical: bool = True, resort_index: Optional[Union[pd.Series, pd.Index]] = None,
+              grouping: Optional[Grouping] = None) -> pd.DataFrame:
     """
-    This function is to calculate the average of data
+    This function is to shift the data by k records within groups
     :param df_data: origin data
-    :param cols: the columns for average
-    :param k: the number of last k
-    :param historical:
-    :param group_by:
-    :param resort_index:
-    :return: the result of average
+    :param cols: the columns to shift. If None, all the columns except group_by
+    :param k: the number of records to shift
+    :param historical: if True, shift all the rows. if False, only output the k-th last but one row of each group,
+        with all the columns if cols is None and NaN for the groups with no more than k records
+    :param group_by: the columns for dividing the data into groups
+    :param resort_index: for df_data being a group-sorted result indexed by group_by and the original index, the
+        original index to put the result back into. Prefer grouping, which realigns by position
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
+    :return: the shifted data
     """
-    group_df = df_data.groupby(group_by)
-    if cols is not None:
-        group_df = df_data.groupby(group_by)[cols]
     if historical:
-        df_result = group_df.shift(k)
         if resort_index is not None:
-            df_result = df_result.reset_index(0, drop=True).loc[resort_index, :]
-        return df_result
+            group_df = df_data.groupby(group_by)
+            if cols is not None:
+                group_df = df_data.groupby(group_by)[cols]
+            return group_df.shift(k).reset_index(0, drop=True).loc[resort_index, :]
+
+        if cols is None:
+            cols = [c for c in df_data.columns if c not in group_by]
+        if grouping is None:
+            grouping = Grouping(df_data, group_by)
+        # take the source records by position, which also works for a non-unique index
+        source = grouping.lag_positions(k)
+        df_result = df_data[cols].iloc[np.maximum(source, 0)]
+        df_result.index = df_data.index
+        return df_result.where(np.broadcast_to((source >= 0)[:, None], df_result.shape))
     else:
-        return group_df.apply(lambda x: x.iloc[- k - 1, :] if k < x.shape[0] else None)
+        if cols is None:
+            cols = list(df_data.columns)
+        if grouping is None:
+            grouping = Grouping(df_data, group_by)
+        # the record k records before the last one of each group
+        source = grouping.offsets[1:] - k - 1
+        found = source >= grouping.offsets[:-1]
+        df_result = df_data[cols].iloc[grouping.order[np.where(found, source, 0)]]
+        df_result.index = grouping.keys
+        return df_result.where(np.broadcast_to(found[:, None], df_result.shape))
+
+
+@instrumented
+def group_lags(df_data: pd.DataFrame, cols: List[str], k: int, group_by: Optional[List[str]] = None,
+               as_frame: bool = False, record_order: bool = False,
+               grouping: Optional[Grouping] = None) -> Union[Tuple[np.ndarray, Grouping], np.ndarray, pd.DataFrame]:
+    """
+    This function is to shift the data by 1 to k records within groups at once. The group-sorted values are put in
+        one buffer with k NaN rows before every group, and the lags of a record are read from a sliding window view
+        of the buffer, instead of making k shifted copies of the data
+    :param df_data: origin data
+    :param cols: the columns to shift
+    :param k: the largest number of records to shift
+    :param group_by: the columns for dividing the data into groups. If None, the whole data is one group
+    :param as_frame: If True, return a DataFrame in the record order with the columns named '{col}_lag_{j}'
+    :param record_order: If True, return the lags gathered into the record order, an array of shape
+        (records, k, len(cols)) with the lag j at j - 1
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
+    :return: by default, the read-only window view over the buffer and the Grouping, without copying the lags:
+        the lags of the i-th group-sorted record, in the g-th group, are at view[i + k * g], the lag j at j - 1
+    """
+    if grouping is None:
+        grouping = Grouping(df_data, group_by)
+    n_valid = grouping.n_valid
+    # the window of the i-th group-sorted record in the g-th group
+    windows = np.arange(n_valid) + k * np.repeat(np.arange(grouping.n_groups), grouping.sizes)
+    buffer = np.full((n_valid + k * max(grouping.n_groups, 1), len(cols)), np.nan)
+    buffer[windows + k] = grouping.sort(df_data[cols].to_numpy(dtype=float))
+    # window p holds the k rows before row p + k, the latest first
+    lags = np.lib.stride_tricks.sliding_window_view(buffer, k, axis=0)[:, :, ::-1].swapaxes(1, 2)
+    if not as_frame and not record_order:
+        return lags, grouping
+
+    result = np.full((grouping.order.shape[0], k, len(cols)), np.nan)
+    result[grouping.order[:n_valid]] = lags[windows]
+    if as_frame:
+        columns = ['{}_lag_{}'.format(c, j) for j in range(1, k + 1) for c in cols]
+        return pd.DataFrame(result.reshape(result.shape[0], -1), columns=columns, index=df_data.index)
+    return result
@@ -0,0 +1,243 @@
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class GroupState:
+    """
+    Base class of the incremental feature states. A state keeps, for every group, just enough of the history to
+        produce the historical feature of the next record of that group, so a new record costs O(1) instead of a
+        recomputation over the whole data.
+    :param cols: the columns for the calculation
+    :param group_by: the columns for dividing the data into groups. If None, the whole data is one group
+    """
+
+    def __init__(self, cols: List[str], group_by: Optional[List[str]] = None):
+        self.cols = list(cols)
+        self.group_by = list(group_by) if group_by else []
+        self._states: Dict[Tuple, Any] = {}
+
+    def _init_state(self) -> Any:
+        raise NotImplementedError
+
+    def _value(self, state: Any) -> np.ndarray:
+        raise NotImplementedError
+
+    def _push(self, state: Any, values: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def _key(self, row: Mapping) -> Tuple:
+        return tuple(row[c] for c in self.group_by)
+
+    def _state(self, key: Tuple) -> Any:
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = self._init_state()
+        return state
+
+    def fit(self, df_data: pd.DataFrame) -> "GroupState":
+        """
+        This function is to build the state from the historical data
+        :param df_data: input data, in the same order as for the historical calculation
+        :return: the state itself
+        """
+        values = df_data[self.cols].to_numpy(dtype=float)
+        if self.group_by:
+            keys = zip(*[df_data[c].to_list() for c in self.group_by])
+        else:
+            keys = (() for _ in range(len(df_data)))
+        for key, row in zip(keys, values):
+            self._push(self._state(key), row)
+        return self
+
+    def update(self, row: Mapping) -> np.ndarray:
+        """
+        This function is to return the historical feature of a new record and then add the record to the state
+        :param row: the new record, e.g. a dict or a pd.Series with the group_by columns and the cols
+        :return: the feature of the record in the order of cols, the same as the historical=True calculation
+            over the data with the record appended
+        """
+        state = self._state(self._key(row))
+        result = self._value(state)
+        self._push(state, np.array([row[c] for c in self.cols], dtype=float))
+        return result
+
+    def peek(self, row: Mapping) -> np.ndarray:
+        """
+        This function is to return the historical feature of a new record without adding it to the state
+        :param row: the new record, only the group_by columns are needed
+        :return: the feature of the record in the order of cols
+        """
+        state = self._states.get(self._key(row))
+        if state is None:
+            return self._value(self._init_state())
+        return self._value(state)
+
+    def snapshot(self) -> pd.DataFrame:
+        """
+        This function is to return the feature that the next record of each group would get
+        :return: the features indexed by the groups
+        """
+        keys = list(self._states.keys())
+        data = [self._value(self._states[key]) for key in keys]
+        if not self.group_by:
+            index = None
+        elif len(self.group_by) == 1:
+            index = pd.Index([key[0] for key in keys], name=self.group_by[0])
+        else:
+            index = pd.MultiIndex.from_tuples(keys, names=self.group_by)
+        df_result = pd.DataFrame(np.array(data).reshape(len(keys), len(self.cols)), columns=self.cols, index=index)
+        return df_result.sort_index() if self.group_by else df_result
+
+
+class _Window:
+    """
+    Ring buffer of the last k records of a group.
+    """
+    __slots__ = ("buffer", "pos", "size")
+
+    def __init__(self, k: int, n_cols: int):
+        self.buffer = np.full((k, n_cols), np.nan)
+        self.pos = 0
+        self.size = 0
+
+    def push(self, values: np.ndarray) -> None:
+        self.buffer[self.pos] = values
+        self.pos = (self.pos + 1) % self.buffer.shape[0]
+        self.size = min(self.size + 1, self.buffer.shape[0])
+
+    def filled(self) -> np.ndarray:
+        return self.buffer[:self.size]
+
+
+class LastKSumState(GroupState):
+    """
+    Incremental state of last_k_sum / group_last_k_sum.
+    :param cols: the columns for the sum calculation
+    :param k: the number of last k records
+    :param group_by: the columns for dividing the data into groups
+    """
+
+    def __init__(self, cols: List[str], k: int, group_by: Optional[List[str]] = None):
+        super().__init__(cols, group_by)
+        self.k = k
+
+    def _init_state(self) -> _Window:
+        return _Window(self.k, len(self.cols))
+
+    def _value(self, state: _Window) -> np.ndarray:
+        if state.size < self.k:
+            return np.full(len(self.cols), np.nan)
+        # a NaN inside the window makes the sum NaN, as rolling(k) requires k observations
+        return state.buffer.sum(axis=0)
+
+    def _push(self, state: _Window, values: np.ndarray) -> None:
+        state.push(values)
+
+
+class LastKAvgState(LastKSumState):
+    """
+    Incremental state of last_k_avg / group_last_k_avg.
+    :param cols: the columns for the average calculation
+    :param k: the number of last k records
+    :param group_by: the columns for dividing the data into groups
+    """
+
+    def _value(self, state: _Window) -> np.ndarray:
+        window = state.filled()
+        observed = ~np.isnan(window)
+        n = observed.sum(axis=0)
+        total = np.where(observed, window, 0.0).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, total / n, np.nan)
+
+
+class SumState(GroupState):
+    """
+    Incremental state of cum_sum / group_sum.
+    :param cols: the columns for the cumulated sum calculation
+    :param group_by: the columns for dividing the data into groups
+    """
+
+    def _init_state(self) -> np.ndarray:
+        # row 0 is the running sum, row 1 the number of observations
+        return np.zeros((2, len(self.cols)))
+
+    def _value(self, state: np.ndarray) -> np.ndarray:
+        return np.where(state[1] > 0, state[0], np.nan)
+
+    def _push(self, state: np.ndarray, values: np.ndarray) -> None:
+        observed = ~np.isnan(values)
+        state[0] += np.where(observed, values, 0.0)
+        state[1] += observed
+
+
+class AvgState(SumState):
+    """
+    Incremental state of avg / group_avg.
+    :param cols: the columns for the average calculation
+    :param group_by: the columns for dividing the data into groups
+    """
+
+    def _value(self, state: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(state[1] > 0, state[0] / state[1], np.nan)
+
+
+class MomentAvgState(GroupState):
+    """
+    Incremental state of moment_avg / group_moment_avg, following the recurrence of ewm(alpha, adjust=False).
+    :param cols: the columns for the moment average calculation
+    :param alpha: smoothing factor, 0 < alpha <= 1
+    :param group_by: the columns for dividing the data into groups
+    """
+
+    def __init__(self, cols: List[str], alpha: float, group_by: Optional[List[str]] = None):
+        super().__init__(cols, group_by)
+        self.alpha = alpha
+
+    def _init_state(self) -> np.ndarray:
+        # row 0 is the weighted average, row 1 the weight of the old average
+        state = np.empty((2, len(self.cols)))
+        state[0] = np.nan
+        state[1] = 1.0
+        return state
+
+    def _value(self, state: np.ndarray) -> np.ndarray:
+        return state[0].copy()
+
+    def _push(self, state: np.ndarray, values: np.ndarray) -> None:
+        weighted, old_wt = state[0], state[1]
+        observed = ~np.isnan(values)
+        started = ~np.isnan(weighted)
+        old_wt[started] *= 1.0 - self.alpha
+        mix = started & observed & (weighted != values)
+        weighted[mix] = (old_wt[mix] * weighted[mix] + self.alpha * values[mix]) / (old_wt[mix] + self.alpha)
+        weighted[~started & observed] = values[~started & observed]
+        old_wt[observed] = 1.0
+
+
+class LagState(GroupState):
+    """
+    Incremental state of lag / group_lag.
+    :param cols: the columns for the lag calculation
+    :param k: the number of records to shift
+    :param group_by: the columns for dividing the data into groups
+    """
+
+    def __init__(self, cols: List[str], k: int, group_by: Optional[List[str]] = None):
+        super().__init__(cols, group_by)
+        self.k = k
+
+    def _init_state(self) -> _Window:
+        return _Window(self.k, len(self.cols))
+
+    def _value(self, state: _Window) -> np.ndarray:
+        if state.size < self.k:
+            return np.full(len(self.cols), np.nan)
+        # the oldest record in a full ring buffer is the one at the write position
+        return state.buffer[state.pos].copy()
+
+    def _push(self, state: _Window, values: np.ndarray) -> None:
+        state.push(values)
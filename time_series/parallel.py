@@ -0,0 +1,95 @@
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .progress import report
+
+
+def _to_shared(values: np.ndarray, blocks: List[shared_memory.SharedMemory]) -> str:
+    block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+    return block.name
+
+
+def _run_shard(func: Callable, columns: list, shard_name: str, n: int, shard: int, kwargs: dict) -> pd.DataFrame:
+    blocks = []
+    try:
+        block = shared_memory.SharedMemory(name=shard_name)
+        blocks.append(block)
+        rows = np.flatnonzero(np.ndarray((n,), dtype=np.int64, buffer=block.buf) == shard)
+
+        data = {}
+        for name, block_name, dtype, uniques in columns:
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            values = np.ndarray((n,), dtype=dtype, buffer=block.buf)[rows]
+            data[name] = values if uniques is None else pd.api.extensions.take(uniques, values, allow_fill=True)
+        df_shard = pd.DataFrame(data, index=rows)
+        return func(df_shard, **kwargs)
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def shard_apply(func: Callable, df_data: pd.DataFrame, group_by: List[str], n_jobs: Optional[int] = None,
+                **kwargs) -> pd.DataFrame:
+    """
+    This function is to run a grouped function on worker processes, each of them working on the groups of one hash
+        partition of the data. The columns are passed to the workers through shared memory.
+    :param func: the grouped function, e.g. group_last_k_sum or weight_streak
+    :param df_data: input data
+    :param group_by: the columns for dividing the data into groups, also passed to func if it has a group_by argument
+    :param n_jobs: the number of worker processes. If None, the number of CPUs
+    :param kwargs: the other arguments of func
+    :return: the result of func, in the record order of df_data for the results aligned to the records
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if 'group_by' in inspect.signature(func).parameters:
+        kwargs['group_by'] = group_by
+    n = df_data.shape[0]
+
+    # the groups are partitioned by the hash of their keys, so that a group is never split between workers
+    shard_ids = (pd.util.hash_pandas_object(df_data[group_by], index=False).to_numpy() % n_jobs).astype(np.int64)
+
+    blocks: List[shared_memory.SharedMemory] = []
+    try:
+        shard_name = _to_shared(shard_ids, blocks)
+        columns = []
+        for name in df_data.columns:
+            dtype = df_data[name].dtype
+            if isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+                columns.append((name, _to_shared(df_data[name].to_numpy(), blocks), dtype.str, None))
+            else:
+                # other columns are shared as integer codes and rebuilt from their unique values
+                codes, uniques = pd.factorize(df_data[name])
+                columns.append((name, _to_shared(codes.astype(np.int64), blocks), np.dtype(np.int64).str,
+                                pd.Index(uniques).array))
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_run_shard, func, columns, shard_name, n, shard, kwargs)
+                       for shard in range(n_jobs)]
+            results = []
+            for future in futures:
+                results.append(future.result())
+                report('shard_apply', len(results), n_jobs)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    shard_rows = [np.flatnonzero(shard_ids == shard) for shard in range(n_jobs)]
+    if all(result.index.equals(pd.Index(rows)) for result, rows in zip(results, shard_rows)):
+        # results aligned to the records are put back into the record order by position
+        df_result = pd.concat(results)
+        order = np.empty(n, dtype=np.int64)
+        order[np.concatenate(shard_rows)] = np.arange(n)
+        df_result = df_result.iloc[order]
+        df_result.index = df_data.index
+        return df_result
+    return pd.concat(results).sort_index()
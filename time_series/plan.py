@@ -0,0 +1,131 @@
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import _kernels
+from .avg import group_avg, group_last_k_avg, group_moment_avg
+from .diff import group_last_k_diff_avg, group_last_k_diff_sum
+from .grouping import Grouping
+from .lag import group_lag
+from .sum import group_last_k_sum, group_sum
+
+_SUPPORTED = (group_last_k_sum, group_last_k_avg, group_sum, group_avg, group_moment_avg, group_lag,
+              group_last_k_diff_sum, group_last_k_diff_avg)
+
+
+class Feature:
+    """
+    The spec of a feature in a FeaturePlan.
+    :param func: the grouped function of the feature, e.g. group_last_k_sum
+    :param name: the prefix of the output columns. If None, it is made from the function name and its parameters
+    :param kwargs: the arguments of the function besides df_data, group_by and historical, e.g. cols and k
+    """
+
+    def __init__(self, func: Callable, name: Optional[str] = None, **kwargs):
+        if func not in _SUPPORTED:
+            raise ValueError("{} is not supported by FeaturePlan".format(func.__name__))
+        self.func = func
+        self.kwargs = kwargs
+        if name is None:
+            params = [str(kwargs[p]) for p in ('k', 'alpha') if p in kwargs]
+            name = '_'.join([func.__name__[len('group_'):]] + params)
+        self.name = name
+
+    @property
+    def input_cols(self) -> List[str]:
+        if 'a_cols' in self.kwargs:
+            return list(self.kwargs['a_cols']) + list(self.kwargs['b_cols'])
+        return list(self.kwargs['cols'])
+
+    @property
+    def output_cols(self) -> List[str]:
+        cols = self.kwargs['a_cols'] if 'a_cols' in self.kwargs else self.kwargs['cols']
+        return ['{}_{}'.format(self.name, c) for c in cols]
+
+
+class FeaturePlan:
+    """
+    A set of grouped historical features computed over one shared group-sorted layout: the groups are factorized
+        and sorted once and the columns are gathered once into group-sorted values shared by all the features.
+    :param features: the specs of the features
+    :param group_by: the columns for dividing the data into groups. If None, the whole data is one group
+    """
+
+    def __init__(self, features: List[Feature], group_by: Optional[List[str]] = None):
+        self.features = list(features)
+        self.group_by = group_by
+
+    @property
+    def passes_saved(self) -> int:
+        """
+        The number of groupby passes saved compared with calling every function on its own, each of which groups
+            the data once, while the plan groups it once for all the features
+        """
+        return max(len(self.features) - 1, 0)
+
+    def compute(self, df_data: pd.DataFrame, grouping: Optional[Grouping] = None) -> pd.DataFrame:
+        """
+        This function is to calculate all the features of the plan
+        :param df_data: input data
+        :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
+        :return: the historical features of all the records, aligned to df_data
+        """
+        if grouping is None:
+            grouping = Grouping(df_data, self.group_by)
+        cols = list(dict.fromkeys(c for f in self.features for c in f.input_cols))
+        col_pos = {c: i for i, c in enumerate(cols)}
+        values = grouping.sort(df_data[cols].to_numpy(dtype=float))
+        # the history of every record is all the previous records of its group
+        history = _kernels.window_bounds(grouping.starts)
+
+        results = []
+        for f in self.features:
+            idx = [col_pos[c] for c in f.input_cols]
+            results.append(self._evaluate(f, values[:, idx], grouping.offsets, *history))
+
+        result = np.hstack(results) if results else np.empty((grouping.n_valid, 0))
+        columns = [c for f in self.features for c in f.output_cols]
+        return pd.DataFrame(grouping.scatter(result), columns=columns, index=df_data.index)
+
+    @staticmethod
+    def _evaluate(feature: Feature, values: np.ndarray, offsets: np.ndarray, start: np.ndarray, end: np.ndarray,
+                  moment: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        The features of records whose history is the group-sorted records from start to end, shared by compute,
+            ChunkedPlan and AsOfIndex.
+        :param feature: the feature
+        :param values: the group-sorted values of the input columns of the feature
+        :param offsets: the group offsets, with the total number of records as the last element
+        :param start: the start of the group of every history
+        :param end: the record after the last one of every history
+        :param moment: the moment average including each record, for group_moment_avg. If None, it is calculated
+        :return: the features, one row per history
+        """
+        func = feature.func
+        kwargs = feature.kwargs
+        if func in (group_last_k_sum, group_last_k_diff_sum):
+            begin = np.maximum(start, end - kwargs['k'])
+            result = _kernels.window_sum(values, offsets, begin, end, min_count=kwargs['k'])
+        elif func in (group_last_k_avg, group_last_k_diff_avg):
+            result = _kernels.window_mean(values, offsets, np.maximum(start, end - kwargs['k']), end)
+        elif func is group_sum:
+            result = _kernels.window_sum(values, offsets, start, end)
+        elif func is group_avg:
+            result = _kernels.window_mean(values, offsets, start, end)
+        else:
+            if func is group_moment_avg:
+                # the moment average of the last record of the history
+                source = moment if moment is not None else _kernels.ewm_mean(values, offsets, kwargs['alpha'])
+                k = 1
+            else:
+                source = values
+                k = kwargs['k']
+            result = np.full((end.shape[0], values.shape[1]), np.nan)
+            has = end - start >= k
+            result[has] = source[end[has] - k]
+
+        if 'a_cols' in kwargs:
+            n_a = len(kwargs['a_cols'])
+            result = result[:, :n_a] - result[:, n_a:]
+        return result
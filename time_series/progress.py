@@ -0,0 +1,80 @@
+from typing import Callable, Dict, List, Optional
+
+# the callbacks called with the progress of the long operations, nothing is reported while it is empty
+_callbacks: List[Callable[[str, int, Optional[int]], None]] = []
+
+
+def register_callback(callback: Callable[[str, int, Optional[int]], None]) -> None:
+    """
+    This function is to register a callback called with the progress of the long operations
+    :param callback: the callback, called with the name of the operation, the number of steps done and the total
+        number of steps (None if it is not known in advance)
+    """
+    _callbacks.append(callback)
+
+
+def remove_callback(callback: Callable[[str, int, Optional[int]], None]) -> None:
+    """
+    This function is to remove a registered callback
+    :param callback: the callback
+    """
+    _callbacks.remove(callback)
+
+
+def report(task: str, done: int, total: Optional[int] = None) -> None:
+    """
+    This function is to report the progress of an operation to the registered callbacks
+    :param task: the name of the operation
+    :param done: the number of steps done
+    :param total: the total number of steps, None if it is not known in advance
+    """
+    for callback in list(_callbacks):
+        callback(task, done, total)
+
+
+class Progress:
+    """
+    Context manager reporting the progress of the long operations run inside it to a callback.
+    :param callback: the callback, see register_callback. If None, the progress is shown with tqdm bars
+    """
+
+    def __init__(self, callback: Optional[Callable[[str, int, Optional[int]], None]] = None):
+        self.callback = callback if callback is not None else TqdmCallback()
+
+    def __enter__(self) -> "Progress":
+        register_callback(self.callback)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        remove_callback(self.callback)
+        if isinstance(self.callback, TqdmCallback):
+            self.callback.close()
+
+
+class TqdmCallback:
+    """
+    Callback showing one tqdm bar per operation. tqdm is only imported when the first progress is reported.
+    """
+
+    def __init__(self):
+        self._bars: Dict[str, object] = {}
+
+    def __call__(self, task: str, done: int, total: Optional[int] = None) -> None:
+        bar = self._bars.get(task)
+        if bar is None or done == 0 and bar.n > 0:
+            from tqdm import tqdm
+
+            if bar is not None:
+                bar.close()
+            bar = self._bars[task] = tqdm(desc=task, total=total)
+        if total is not None and bar.total != total:
+            bar.total = total
+        bar.update(done - bar.n)
+        if total is not None and done >= total:
+            bar.close()
+            del self._bars[task]
+
+    def close(self) -> None:
+        for bar in self._bars.values():
+            bar.close()
+        self._bars.clear()
@@ -0,0 +1,172 @@
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+_META = 'meta.json'
+_INDEX_PREFIX = '__index_{}__'
+
+
+class FeatureStore:
+    """
+    A directory of feature columns, one raw binary file per column read back as a memory map, so that a reader maps
+        only the columns it needs with column() without loading or copying them. read() builds a DataFrame, which
+        copies the rows it reads. The metadata file keeps the column dtypes, the
+        number of rows, the names of the index levels, the group_by columns and the categories of the columns of
+        other dtypes, which are stored as integer codes.
+    :param path: the directory of the store, created by the first append
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta: Optional[dict] = None
+        if os.path.exists(os.path.join(path, _META)):
+            with open(os.path.join(path, _META)) as f:
+                self.meta = json.load(f)
+
+    @property
+    def n_rows(self) -> int:
+        return self.meta['n_rows'] if self.meta else 0
+
+    @property
+    def columns(self) -> List[str]:
+        return [c['name'] for c in self.meta['columns'] if not c['index']] if self.meta else []
+
+    @property
+    def group_by(self) -> List[str]:
+        return self.meta['group_by'] if self.meta else []
+
+    def _file(self, i: int) -> str:
+        return os.path.join(self.path, 'col_{}.bin'.format(i))
+
+    def _save_meta(self) -> None:
+        tmp = os.path.join(self.path, _META + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, _META))
+
+    def _create(self, df_data: pd.DataFrame, group_by: List[str]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        index_names = [_INDEX_PREFIX.format(i) for i in range(df_data.index.nlevels)]
+        columns = []
+        for name, series in list(zip(index_names, self._index_levels(df_data))) + list(df_data.items()):
+            if not isinstance(name, str):
+                raise Exception("column names should be strings, got {!r}".format(name))
+            dtype = series.dtype
+            if isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+                columns.append({'name': name, 'dtype': dtype.str, 'categories': None})
+            else:
+                columns.append({'name': name, 'dtype': np.dtype(np.int32).str, 'categories': []})
+            columns[-1]['index'] = name in index_names
+        self.meta = {
+            'n_rows': 0,
+            'columns': columns,
+            'index_names': list(df_data.index.names),
+            'group_by': list(group_by or []),
+        }
+
+    @staticmethod
+    def _index_levels(df_data: pd.DataFrame) -> List[pd.Series]:
+        return [pd.Series(df_data.index.get_level_values(i)) for i in range(df_data.index.nlevels)]
+
+    def append(self, df_data: pd.DataFrame, group_by: Optional[List[str]] = None) -> None:
+        """
+        This function is to append rows to the store, creating it with the columns of the first rows
+        :param df_data: the rows, e.g. the result of a time_series function joined with the group_by columns. The
+            index is stored as well
+        :param group_by: the group key columns of df_data, recorded in the metadata when the store is created
+        """
+        if self.meta is None:
+            self._create(df_data, group_by)
+        names = [c['name'] for c in self.meta['columns'] if not c['index']]
+        if list(df_data.columns) != names:
+            raise Exception("the columns {} do not match the columns of the store {}".format(
+                list(df_data.columns), names))
+
+        series = self._index_levels(df_data) + [df_data[c] for c in names]
+        # every column is converted before any is written, so that a rejected append leaves the store unchanged
+        arrays = []
+        categories = []
+        for column, values in zip(self.meta['columns'], series):
+            if column['categories'] is not None:
+                # new categories are added behind the known ones, so that the stored codes stay valid
+                known = pd.Index(column['categories'])
+                known = known.append(pd.Index(values.dropna().unique()).difference(known))
+                categories.append(np.asarray(known, dtype=object).tolist())
+                arrays.append(pd.Categorical(values, categories=known).codes.astype(np.int32))
+            else:
+                dtype = np.dtype(column['dtype'])
+                if not isinstance(values.dtype, np.dtype) or not np.can_cast(values.dtype, dtype, 'safe'):
+                    raise Exception("the dtype {} of column {} cannot be stored as {} without loss".format(
+                        values.dtype, column['name'], dtype))
+                categories.append(None)
+                arrays.append(values.to_numpy(dtype=dtype))
+
+        n_rows = self.n_rows
+        for i, (column, array, known) in enumerate(zip(self.meta['columns'], arrays, categories)):
+            column['categories'] = known
+            with open(self._file(i), 'ab') as f:
+                # drop the rows of an interrupted append, which are not counted in the metadata
+                f.truncate(n_rows * np.dtype(column['dtype']).itemsize)
+                f.write(np.ascontiguousarray(array).tobytes())
+        self.meta['n_rows'] = n_rows + df_data.shape[0]
+        self._save_meta()
+
+    def _map(self, i: int) -> np.ndarray:
+        column = self.meta['columns'][i]
+        dtype = np.dtype(column['dtype'])
+        if self.n_rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(i), dtype=dtype, mode='r', shape=(self.n_rows,))
+
+    def _position(self, name: str) -> int:
+        for i, column in enumerate(self.meta['columns'] if self.meta else []):
+            if column['name'] == name and not column['index']:
+                return i
+        raise Exception("column {} is not in the store".format(name))
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        This function is to map a column without reading it
+        :param name: the column name
+        :return: the read-only memory map of the column, the integer codes for a column of categories
+        """
+        return self._map(self._position(name))
+
+    def categories(self, name: str) -> Optional[list]:
+        """
+        This function is to return the categories of a column stored as integer codes
+        :param name: the column name
+        :return: the categories, None for a numeric column
+        """
+        return self.meta['columns'][self._position(name)]['categories']
+
+    def read(self, columns: Optional[List[str]] = None, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """
+        This function is to read columns into a DataFrame, a copy of the rows. Use column to map a column without
+            copying it
+        :param columns: the columns to read. If None, all the columns
+        :param start: the first row
+        :param stop: the row after the last one. If None, the last row of the store
+        :return: the rows with their index, the columns of categories as categoricals
+        """
+        if self.meta is None:
+            return pd.DataFrame(columns=columns)
+        columns = self.columns if columns is None else columns
+        rows = slice(start, stop)
+
+        def values(i: int):
+            column = self.meta['columns'][i]
+            array = self._map(i)[rows]
+            if column['categories'] is None:
+                return array
+            return pd.Categorical.from_codes(array, categories=column['categories'])
+
+        levels = [values(i) for i, c in enumerate(self.meta['columns']) if c['index']]
+        if len(levels) == 1:
+            index = pd.Index(levels[0], name=self.meta['index_names'][0])
+        else:
+            index = pd.MultiIndex.from_arrays(levels, names=self.meta['index_names'])
+        return pd.DataFrame({c: values(self._position(c)) for c in columns}, index=index, columns=columns)
@@ -1,11 +1,71 @@
+from typing import List, Optional, Sequence
+
 import numpy as np
 import pandas as pd
 
-from .lag import group_lag
+from .grouping import Grouping
+from .instrument import instrumented
+
+
+@instrumented
+def weighted_last_k(df_data: pd.DataFrame, cols: List[str], weights: Sequence[float],
+                    group_by: Optional[List[str]] = None, normalize: bool = True,
+                    historical: bool = True, grouping: Optional[Grouping] = None) -> pd.DataFrame:
+    """
+    This function is to calculate the weighted sum of the last k records, k being the number of weights
+    :param df_data: input data
+    :param cols: the columns for the weighted sum calculation
+    :param weights: the weights of the last k records, from the oldest to the latest. A window with less than k
+        records uses the leading weights
+    :param group_by: the columns for dividing the data into groups. If None, the whole data is one group
+    :param normalize: If True, divide the weighted sum by the sum of the weights used
+    :param historical: If True, return the weighted sum of the last k records for each actual record within each
+        group. If False, only return the weighted sum of the last k records of the data within each group
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
+    :return: the result of the weighted sum calculation, NaN if a NaN is in the window
+    """
+    w = np.asarray(weights, dtype=float)
+    k = w.shape[0]
+    if grouping is None:
+        grouping = Grouping(df_data, group_by)
+    x = grouping.sort(df_data[cols].to_numpy(dtype=float))
+    missing = np.isnan(x)
+    x = np.where(missing, 0.0, x)
+    w_sum = np.concatenate([[np.nan], np.cumsum(w)])
+
+    if historical:
+        # the window of a record is the min(k, position) records before it, the record s steps back gets
+        # the weight w[window - s]
+        window = np.minimum(grouping.positions, k)
+        total = np.zeros_like(x)
+        missing_in = np.zeros(x.shape, dtype=bool)
+        for s in range(1, k + 1):
+            rows = np.flatnonzero(window >= s)
+            total[rows] += w[window[rows] - s][:, None] * x[rows - s]
+            missing_in[rows] |= missing[rows - s]
+        norm = w_sum[window][:, None] if normalize else np.where(window > 0, 1.0, np.nan)[:, None]
+        result = np.where(missing_in, np.nan, total / norm)
+        return pd.DataFrame(grouping.scatter(result), columns=cols, index=df_data.index)
+    else:
+        # the window of a group is its last min(k, size) records
+        window = np.minimum(grouping.sizes, k)
+        size = np.repeat(grouping.sizes, grouping.sizes)
+        tail = grouping.positions >= size - np.repeat(window, grouping.sizes)
+        j = (grouping.positions - size)[tail] + np.repeat(window, window)
+        tail_offsets = np.cumsum(window) - window
+        if tail_offsets.shape[0]:
+            total = np.add.reduceat(w[j][:, None] * x[tail], tail_offsets, axis=0)
+            missing_in = np.add.reduceat(missing[tail], tail_offsets, axis=0) > 0
+        else:
+            total = missing_in = np.empty((0, len(cols)))
+        norm = w_sum[window][:, None] if normalize else 1.0
+        result = np.where(missing_in, np.nan, total / norm)
+        return pd.DataFrame(result, columns=cols, index=grouping.keys)
 
 
+@instrumented
 def weight_streak(df_data: pd.DataFrame, team_id: str, k: int, outcome_col: str,
-                  historical: bool = True) -> pd.DataFrame:
+                  historical: bool = True, grouping: Optional[Grouping] = None) -> pd.DataFrame:
     """
     The streak method is from paper <<Predictive analysis and modelling football results using machine learning approach
         for English Premier League>> which encapsulates the recent performances of a team.
@@ -15,19 +75,12 @@ def weight_streak(df_data: pd.DataFrame, team_id: str, k: int, outcome_col: str,
     :param outcome_col: 0 means a loss, 1 means a draw, and 2 means a win
     :param historical: if True, return the actual streak scores obtained from the previous matches for the actual team.
         If False, only return the final streak score for each team.
+    :param grouping: the Grouping of df_data by team_id, reused instead of grouping the data again
     :return: the result of the streak score
     """
     outcome = df_data[outcome_col].map({0: 0, 1: 1, 2: 3})
     df_data = pd.concat([df_data[team_id], outcome], axis=1)
 
-    def streak(df: pd.Series):
-        L = len(df)
-        w = np.arange(1, L + 1)
-        return 2 * (df.to_numpy() * w).sum() / (3 * L * (L + 1))
-
-    if historical:
-        df_result = df_data.groupby(team_id)[[outcome_col]].rolling(k, min_periods=1).apply(streak)
-        df_result = group_lag(df_result, k=1, group_by=[team_id], historical=True, resort_index=df_data.index)
-        return df_result
-    else:
-        return df_data.groupby(team_id)[[outcome_col]].apply(lambda x: x.tail(k).apply(streak))
+    # 2 * sum(i * x_i) / (3 * L * (L + 1)) is the average of the points weighted by 1..L, divided by 3
+    return weighted_last_k(df_data, [outcome_col], np.arange(1, k + 1), group_by=[team_id],
+                           historical=historical, grouping=grouping) / 3
@@ -0,0 +1,146 @@
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import _kernels
+from .avg import group_avg, group_moment_avg
+from .grouping import Grouping
+from .plan import FeaturePlan
+from .progress import report
+from .sum import group_sum
+
+# the features depending on all the previous records of a group, carried as running totals
+_EXPANDING = (group_sum, group_avg)
+
+
+class ChunkedPlan:
+    """
+    Calculates the historical features of a FeaturePlan over data coming in chunks, e.g. from
+        pd.read_csv(..., chunksize=n), with the same result row for row as plan.compute over the concatenated data.
+        Between the chunks it carries, for every group, the last k records of the rolling and lag features, the
+        running sums and numbers of observations of the expanding features and the state of the moment averages,
+        so the memory is bounded by the chunk size plus the state.
+    :param plan: the features to calculate, the ungrouped functions are the plan features with group_by None
+    """
+
+    def __init__(self, plan: FeaturePlan):
+        self.plan = plan
+        self.group_by = list(plan.group_by) if plan.group_by else []
+        self.cols = list(dict.fromkeys(c for f in plan.features for c in f.input_cols))
+        self._col_pos = {c: i for i, c in enumerate(self.cols)}
+        # the number of last records of a group kept for the rolling and lag features
+        self.tail_size = max([f.kwargs['k'] for f in plan.features
+                              if f.func not in _EXPANDING and f.func is not group_moment_avg] or [0])
+
+        self._tail: Optional[pd.DataFrame] = None
+        self._keys: Optional[pd.Index] = None
+        self._sums = np.zeros((0, len(self.cols)))
+        self._counts = np.zeros((0, len(self.cols)))
+        self._ewm: Dict[int, tuple] = {}
+
+    def _state_rows(self, keys: pd.Index) -> np.ndarray:
+        # positions of the groups in the state arrays, adding the groups not seen before
+        if self._keys is None:
+            self._keys = keys[:0]
+        rows = self._keys.get_indexer(keys)
+        new = rows < 0
+        if new.any():
+            n_new = int(new.sum())
+            self._keys = self._keys.append(keys[new])
+            self._sums = np.concatenate([self._sums, np.zeros((n_new, len(self.cols)))])
+            self._counts = np.concatenate([self._counts, np.zeros((n_new, len(self.cols)))])
+            for i, (weighted, old_wt) in self._ewm.items():
+                new_weighted, new_old_wt = _kernels.ewm_state(n_new, weighted.shape[1])
+                self._ewm[i] = (np.concatenate([weighted, new_weighted]), np.concatenate([old_wt, new_old_wt]))
+            rows = self._keys.get_indexer(keys)
+        return rows
+
+    def transform(self, df_chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        This function is to calculate the features of the next chunk and carry its state to the following chunk
+        :param df_chunk: the next records, following all the records of the previous chunks
+        :return: the historical features of the records of the chunk, aligned to df_chunk
+        """
+        df_data = df_chunk[self.group_by + self.cols].reset_index(drop=True)
+        n_tail = 0
+        if self._tail is not None:
+            n_tail = self._tail.shape[0]
+            df_data = pd.concat([self._tail, df_data], ignore_index=True)
+        grouping = Grouping(df_data, self.group_by)
+        keys = grouping.keys if self.group_by else pd.RangeIndex(grouping.n_groups)
+        rows = self._state_rows(keys)
+
+        values = grouping.sort(df_data[self.cols].to_numpy(dtype=float))
+        in_chunk = grouping.order[:grouping.n_valid] >= n_tail
+        codes = np.repeat(np.arange(grouping.n_groups), grouping.sizes)
+        # the records of the chunk alone, in the group-sorted order
+        chunk_sizes = np.bincount(codes[in_chunk], minlength=grouping.n_groups)
+        chunk_offsets = np.concatenate([[0], np.cumsum(chunk_sizes)])
+        chunk_positions = np.arange(chunk_offsets[-1]) - np.repeat(chunk_offsets[:-1], chunk_sizes)
+
+        history = _kernels.window_bounds(grouping.starts)
+        expanding = any(f.func in _EXPANDING for f in self.plan.features)
+        if expanding:
+            # the tail records are already in the carried totals
+            chunk_values = np.where(in_chunk[:, None], values, np.nan)
+            chunk_sums, chunk_counts = _kernels.range_sums(chunk_values, grouping.offsets, *history)
+
+        results = []
+        for i, f in enumerate(self.plan.features):
+            idx = [self._col_pos[c] for c in f.input_cols]
+            if f.func in _EXPANDING:
+                s = chunk_sums[:, idx] + self._sums[rows][codes][:, idx]
+                c = chunk_counts[:, idx] + self._counts[rows][codes][:, idx]
+                result = _kernels.sum_or_nan(s, c) if f.func is group_sum else _kernels.mean_or_nan(s, c)
+            elif f.func is group_moment_avg:
+                result = self._moment_avg(i, f.kwargs['alpha'], values[:, idx], in_chunk, rows, codes,
+                                          chunk_offsets, chunk_positions)
+            else:
+                result = FeaturePlan._evaluate(f, values[:, idx], grouping.offsets, *history)
+            results.append(result)
+
+        if expanding:
+            s, c = _kernels.range_sums(chunk_values, grouping.offsets, grouping.offsets[:-1], grouping.offsets[1:])
+            self._sums[rows] += s
+            self._counts[rows] += c
+        if self.tail_size:
+            if self.group_by:
+                self._tail = df_data.groupby(self.group_by, sort=False).tail(self.tail_size)
+            else:
+                self._tail = df_data.tail(self.tail_size)
+
+        result = np.hstack(results) if results else np.empty((grouping.n_valid, 0))
+        columns = [c for f in self.plan.features for c in f.output_cols]
+        return pd.DataFrame(grouping.scatter(result)[n_tail:], columns=columns, index=df_chunk.index)
+
+    def _moment_avg(self, i: int, alpha: float, values: np.ndarray, in_chunk: np.ndarray, rows: np.ndarray,
+                    codes: np.ndarray, chunk_offsets: np.ndarray, chunk_positions: np.ndarray) -> np.ndarray:
+        if i not in self._ewm:
+            self._ewm[i] = _kernels.ewm_state(self._keys.shape[0], values.shape[1])
+        weighted, old_wt = self._ewm[i]
+        state = (weighted[rows], old_wt[rows])
+        before = state[0].copy()
+        # the moment average continues from the carried state over the records of the chunk alone
+        current = _kernels.ewm_mean(values[in_chunk], chunk_offsets, alpha, state)
+        previous = _kernels.shift(current, chunk_positions, 1)
+        first = chunk_positions == 0
+        previous[first] = before[codes[in_chunk][first]]
+        weighted[rows], old_wt[rows] = state
+
+        result = np.full(values.shape, np.nan)
+        result[in_chunk] = previous
+        return result
+
+
+def stream_features(chunks: Iterable[pd.DataFrame], plan: FeaturePlan) -> Iterator[pd.DataFrame]:
+    """
+    This function is to calculate the historical features of data coming in chunks
+    :param chunks: the chunks of the data in the record order, e.g. pd.read_csv(..., chunksize=n)
+    :param plan: the features to calculate
+    :return: the features of every chunk, aligned to the chunk
+    """
+    chunked = ChunkedPlan(plan)
+    for i, df_chunk in enumerate(chunks):
+        yield chunked.transform(df_chunk)
+        report('stream_features', i + 1)
@@ -1,15 +1,15 @@
-import math
-from typing import List
+from typing import List, Optional, Sequence, Union
 
+import numpy as np
 import pandas as pd
-from isodate import DT_BAS_ORD_COMPLETE
-from tqdm import tqdm
 
-from .lag import group_lag
-
-tqdm.pandas()
+from . import _kernels
+from .grouping import Grouping
+from .instrument import instrumented
+from .progress import report
 
 
+@instrumented
 def last_k_sum(df_data: pd.DataFrame, cols: List[str], k: int, historical: bool = True) -> pd.DataFrame:
     """
     This function is to calculate the sum of data
@@ -26,27 +26,39 @@ def last_k_sum(df_data: pd.DataFrame, cols: List[str], k: int, historical: bool
         return df_data[cols].tail(k).sum(min_count=k).to_frame().transpose()
 
 
-def group_last_k_sum(df_data: pd.DataFrame, cols: List[str], k: int, group_by: List[str],
-                     historical: bool = True) -> pd.DataFrame:
+@instrumented
+def group_last_k_sum(df_data: pd.DataFrame, cols: List[str], k: Union[int, Sequence[int]], group_by: List[str],
+                     historical: bool = True, grouping: Optional[Grouping] = None) -> pd.DataFrame:
     """
     This function is to calculate the sum of group data
     :param df_data: input data
     :param cols: the columns for the sum calculation
-    :param k: the number of last k records
+    :param k: the number of last k records. If a list of values is given, all of them are evaluated in one sweep
+        over the group-sorted values and the columns of the result are indexed by k first
     :param group_by: the columns for dividing the data into groups
     :param historical: If True, return the sum of the last k records for each actual record within each group.
         If False, only return the sum of the last k records of the data within each group
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
     :return: the result of the sum calculation
     """
+    ks = np.atleast_1d(np.asarray(k, dtype=np.int64))
+    if grouping is None:
+        grouping = Grouping(df_data, group_by)
+    values = grouping.sort(df_data[cols].to_numpy(dtype=float))
+    columns = pd.MultiIndex.from_product([ks, cols], names=['k', None]) if np.ndim(k) > 0 else cols
     if historical:
-        df_result: pd.DataFrame = df_data \
-            .groupby(group_by)[cols].rolling(k).sum()
-        df_result = group_lag(df_result, k=1, group_by=group_by, historical=True, resort_index=df_data.index)
-        return df_result
+        sums, counts = _kernels.last_k_sums(values, grouping.offsets, grouping.starts, ks)
+        result = np.hstack([_kernels.sum_or_nan(sums[:, j], counts[:, j], min_count=w) for j, w in enumerate(ks)])
+        return pd.DataFrame(grouping.scatter(result), columns=columns, index=df_data.index)
     else:
-        return df_data.groupby(group_by)[cols].apply(lambda x: x.tail(k).sum(min_count=k))
+        results = []
+        for w in ks:
+            s, c = _kernels.tail_sums(values, grouping.offsets, w)
+            results.append(np.where(c >= w, s, np.nan))
+        return pd.DataFrame(np.hstack(results), columns=columns, index=grouping.keys)
 
 
+@instrumented
 def cum_sum(df_data: pd.DataFrame, cols: List[str], historical: bool = True) -> pd.DataFrame:
     """
     This function is to calculate the cumulated sum of data
@@ -62,8 +74,9 @@ def cum_sum(df_data: pd.DataFrame, cols: List[str], historical: bool = True) ->
         return df_data[cols].sum(axis=0)
 
 
+@instrumented
 def group_sum(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
-              historical: bool = True) -> pd.DataFrame:
+              historical: bool = True, grouping: Optional[Grouping] = None) -> pd.DataFrame:
     """
     This function is to calculate the cumulated sum of data within groups
     :param df_data: input data
@@ -71,19 +84,22 @@ def group_sum(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
     :param group_by: the columns for dividing the data into groups
     :param historical: If True, return the cumulated sum of the previous records for each actual record
         within each group. If False, only return the sum of the last k records of the data within each group
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
     :return: the result of sum calculation within each group
     """
     if historical:
-        df_result: pd.DataFrame = df_data \
-            .groupby(group_by)[cols].expanding().sum()
-        df_result = group_lag(df_result, k=1, group_by=group_by, historical=True, resort_index=df_data.index)
-        return df_result
+        if grouping is None:
+            grouping = Grouping(df_data, group_by)
+        values = grouping.sort(df_data[cols].to_numpy(dtype=float))
+        result = _kernels.window_sum(values, grouping.offsets, *_kernels.window_bounds(grouping.starts))
+        return pd.DataFrame(grouping.scatter(result), columns=cols, index=df_data.index)
     else:
         return df_data.groupby(group_by)[cols].sum()
 
 
+@instrumented
 def group_sum_index(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
-                    index: str, interval: float) -> pd.DataFrame:
+                    index: str, interval: float, grouping: Optional[Grouping] = None) -> pd.DataFrame:
     """
     Provide group expanding window cumulated sum by fixed index step.
     :param df_data: input data
@@ -91,52 +107,50 @@ def group_sum_index(df_data: pd.DataFrame, cols: List[str], group_by: List[str],
     :param group_by: the columns for dividing the data into groups
     :param index: the index for segment.
     :param interval: the interval per segment of index.
+    :param grouping: the Grouping of df_data by group_by, reused instead of grouping the data again
     :return: the result of cumulated sum calculation within each group
     """
-
-    def _segment(_df: pd.DataFrame) -> pd.DataFrame:
-        maxv = _df[index].max()
-        c = math.ceil(maxv / interval)
-        idx = 0
-        ds_result = []
-        for i in range(c):
-            current_line = interval * (i + 1)
-            while idx < _df.shape[0]:
-                # if last
-                if idx == _df.shape[0] - 1:
-                    ds = _df.iloc[idx][cols]
-                    ds[index] = current_line
-                    ds_result.append(ds)
-                    break
-
-                if _df.iloc[idx][index] <= current_line < _df.iloc[idx + 1][index]:
-                    ds = _df.iloc[idx][cols]
-                    ds[index] = current_line
-                    ds_result.append(ds)
-                    break
-                elif _df.iloc[idx][index] > current_line:
-                    if idx == 0:
-                        ds = _df.iloc[idx][cols].copy()
-                        ds[:] = 0
-                    else:
-                        ds = _df.iloc[idx - 1][cols]
-                    ds[index] = current_line
-                    ds_result.append(ds)
-                    break
-                elif _df.iloc[idx + 1][index] <= current_line:
-                    idx = idx + 1
-                    continue
-        try:
-            df_res = pd.concat(ds_result, axis=1).transpose().reset_index(drop=True)
-        except ValueError as e:
-            print(_df)
-        return df_res
-
     if df_data.shape[0] == 0:
-        df_group = df_data[cols]
+        return pd.DataFrame(columns=cols + [index], dtype=float,
+                            index=pd.MultiIndex.from_arrays([[]] * (len(group_by) + 1), names=group_by + [None]))
+
+    if grouping is None:
+        grouping = Grouping(df_data, group_by)
+    codes = grouping.codes
+    keys = grouping.keys
+    df_cum = df_data[cols].groupby(codes).cumsum()
+    report('group_sum_index', 1, 4)
+
+    # sort the records by group and then by index, keeping the record order for equal indexes
+    valid = codes < grouping.n_groups
+    codes = codes[valid]
+    values = df_data[index].to_numpy(dtype=float)[valid]
+    order = np.lexsort((values, codes))
+    codes = codes[order]
+    values = values[order]
+    cum = df_cum.to_numpy(dtype=float)[valid][order]
+    report('group_sum_index', 2, 4)
+
+    # one segment line every interval up to the max index of each group
+    maxv = np.full(len(keys), -np.inf)
+    np.maximum.at(maxv, codes, values)
+    n_segment = np.maximum(np.ceil(maxv / interval), 0).astype(np.int64)
+    segment_codes = np.repeat(np.arange(len(keys)), n_segment)
+    segment_num = np.arange(segment_codes.shape[0]) - np.repeat(np.cumsum(n_segment) - n_segment, n_segment)
+    lines = interval * (segment_num + 1)
+
+    # carry the last cumulated value forward, zero before the first record of the group
+    pos = _kernels.asof_positions(codes, values, segment_codes, lines)
+    result = np.where((pos >= 0)[:, None], cum[np.maximum(pos, 0)], 0.0)
+    report('group_sum_index', 3, 4)
+
+    segment_keys = keys.take(segment_codes)
+    if isinstance(segment_keys, pd.MultiIndex):
+        arrays = [segment_keys.get_level_values(i) for i in range(segment_keys.nlevels)]
     else:
-        df_group = df_data.groupby(group_by)[cols].cumsum()
-    df = pd.concat([df_data[group_by + [index]], df_group], axis=1)
-    df = df.sort_values(by=index)
-    df = df.groupby(group_by)[cols + [index]].progress_apply(_segment)
+        arrays = [segment_keys]
+    df = pd.DataFrame(result, columns=cols,
+                      index=pd.MultiIndex.from_arrays(arrays + [segment_num], names=group_by + [None]))
+    df[index] = lines
+    report('group_sum_index', 4, 4)
     return df
@@ -0,0 +1,57 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .instrument import instrumented
+from .plan import Feature, FeaturePlan
+
+
+def _interleave(a: pd.Series, b: pd.Series) -> np.ndarray:
+    # the a and b values of a match are put next to each other, so the long table keeps the match order
+    return np.stack([a.to_numpy(), b.to_numpy()], axis=1).reshape(-1)
+
+
+@instrumented
+def melt_teams(df_data: pd.DataFrame, a_id_col: str, b_id_col: str,
+               cols: Dict[str, Tuple[str, str]]) -> pd.DataFrame:
+    """
+    This function is to turn matches into a long table with one record per team per match
+    :param df_data: input data, one record per match in the match order
+    :param a_id_col: the name of the column containing ids team a
+    :param b_id_col: the name of the column containing ids team b
+    :param cols: the columns of the long table, each given as the pair of match columns seen by team a and by
+        team b, e.g. {'scored': ('a_goals', 'b_goals'), 'conceded': ('b_goals', 'a_goals')}
+    :return: the records of team a and then team b of every match, with the columns 'match' (the position of the
+        match), 'side' ('a' or 'b'), 'team' and the columns of cols
+    """
+    n = df_data.shape[0]
+    data = {
+        'match': np.repeat(np.arange(n), 2),
+        'side': np.tile(np.array(['a', 'b'], dtype=object), n),
+        'team': _interleave(df_data[a_id_col], df_data[b_id_col]),
+    }
+    for name, (a_col, b_col) in cols.items():
+        data[name] = _interleave(df_data[a_col], df_data[b_col])
+    return pd.DataFrame(data)
+
+
+@instrumented
+def team_features(df_data: pd.DataFrame, a_id_col: str, b_id_col: str, features: List[Feature],
+                  cols: Dict[str, Tuple[str, str]]) -> pd.DataFrame:
+    """
+    This function is to calculate the historical features of both teams of every match in one pass over a
+        team-perspective long table, instead of once for the a side and once for the b side
+    :param df_data: input data, one record per match in the match order
+    :param a_id_col: the name of the column containing ids team a
+    :param b_id_col: the name of the column containing ids team b
+    :param features: the specs of the features, on the columns of the long table
+    :param cols: the columns of the long table, see melt_teams
+    :return: the features of team a prefixed with 'a_' and the features of team b prefixed with 'b_', aligned to
+        df_data
+    """
+    df_long = melt_teams(df_data, a_id_col, b_id_col, cols)
+    values = FeaturePlan(features, group_by=['team']).compute(df_long).to_numpy()
+    columns = [c for f in features for c in f.output_cols]
+    return pd.DataFrame(np.hstack([values[0::2], values[1::2]]),
+                        columns=['a_' + c for c in columns] + ['b_' + c for c in columns], index=df_data.index)